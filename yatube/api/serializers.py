@@ -0,0 +1,113 @@
+"""Сериализаторы JSON API.
+
+Данные читаются через ``QuerySet.values()``: на элемент выдачи
+создаётся один словарь вместо экземпляров модели, автора и группы,
+а из базы выбираются только запрошенные через ``?fields=`` колонки.
+"""
+from django.core.files.storage import default_storage
+
+from posts.models import Comment, Follow, Group, Post
+
+
+class UnknownFields(ValueError):
+    pass
+
+
+class Serializer:
+    model = None
+    # имя поля в ответе -> путь для values()
+    fields = {}
+    # порядок выдачи, он же ключ курсора
+    ordering = ()
+
+    def __init__(self, requested=None):
+        names = list(self.fields)
+        if requested:
+            unknown = [name for name in requested if name not in self.fields]
+            if unknown:
+                raise UnknownFields(unknown)
+            names = [name for name in names if name in requested]
+        self.columns = [
+            (name, self.fields[name], getattr(self, f'convert_{name}', None))
+            for name in names
+        ]
+        paths = [path for _, path, _ in self.columns]
+        paths += [name.lstrip('-') for name in self.ordering]
+        self.paths = list(dict.fromkeys(paths))
+
+    @classmethod
+    def from_request(cls, request):
+        requested = request.GET.get('fields', '')
+        requested = [name.strip() for name in requested.split(',')]
+        return cls([name for name in requested if name])
+
+    def rows(self, queryset):
+        return queryset.order_by(*self.ordering).values(*self.paths)
+
+    def to_dict(self, row):
+        data = {}
+        for name, path, convert in self.columns:
+            value = row[path]
+            data[name] = value if convert is None else convert(value)
+        return data
+
+    def many(self, rows):
+        return [self.to_dict(row) for row in rows]
+
+    def one(self, queryset):
+        """Одна запись из queryset или None."""
+        row = queryset.values(*self.paths).first()
+        return None if row is None else self.to_dict(row)
+
+
+class PostSerializer(Serializer):
+    model = Post
+    fields = {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    }
+    ordering = ('-pub_date', '-id')
+
+    @staticmethod
+    def convert_image(name):
+        return default_storage.url(name) if name else None
+
+
+class GroupSerializer(Serializer):
+    model = Group
+    fields = {
+        'id': 'id',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    }
+    ordering = ('slug',)
+
+
+class CommentSerializer(Serializer):
+    model = Comment
+    fields = {
+        'id': 'id',
+        'post': 'post_id',
+        'parent': 'parent_id',
+        'depth': 'depth',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }
+    ordering = ('created', 'id')
+
+
+class FollowSerializer(Serializer):
+    model = Follow
+    fields = {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }
+    ordering = ('-id',)
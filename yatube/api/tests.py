@@ -0,0 +1,215 @@
+import base64
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+from . import views
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', password='secret')
+        cls.reader = User.objects.create_user(
+            username='reader', password='secret')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_post_list_cursor_pagination(self):
+        url = reverse('api:post_list')
+        data = self.get_json(url, limit=3)
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [post.pk for post in reversed(self.posts[2:])],
+        )
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.posts[1].pk, self.posts[0].pk],
+        )
+        self.assertIsNone(data['next'])
+        first = data['results'][0]
+        self.assertEqual(first['author'], 'author')
+        self.assertEqual(first['group'], 'group')
+        self.assertIsNone(first['image'])
+
+    def test_fields_selection(self):
+        data = self.get_json(reverse('api:post_list'), fields='id,text')
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_query_count(self):
+        with self.assertNumQueries(1):
+            self.get_json(reverse('api:post_list'))
+
+    def test_conditional_get(self):
+        url = reverse('api:post_detail', kwargs={'post_id': self.posts[0].pk})
+        response = self.client.get(url)
+        etag = response['ETag']
+        # без выборки и сериализации
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.author_client.patch(
+            url, json.dumps({'text': 'Новый текст'}),
+            content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['text'], 'Новый текст')
+        self.assertEqual(response.json()['group'], 'group')
+
+    def test_create_post_requires_auth(self):
+        url = reverse('api:post_list')
+        body = json.dumps({'text': 'Через API', 'group': 'group'})
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        credentials = base64.b64encode(b'author:secret').decode()
+        response = self.client.post(
+            url, body, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Post.objects.filter(
+            text='Через API', group=self.group, author=self.author).exists())
+
+    def test_basic_auth_result_is_cached(self):
+        url = reverse('api:follow_list')
+        good = base64.b64encode(b'reader:secret').decode()
+        bad = base64.b64encode(b'reader:wrong').decode()
+        with mock.patch('api.views.authenticate',
+                        wraps=views.authenticate) as authenticate:
+            for _ in range(2):
+                response = self.client.get(
+                    url, HTTP_AUTHORIZATION=f'Basic {good}')
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(
+                    url, HTTP_AUTHORIZATION=f'Basic {bad}')
+                self.assertEqual(response.status_code, 401)
+            self.assertEqual(authenticate.call_count, 2)
+            # при сессии заголовок не проверяется
+            self.author_client.get(url, HTTP_AUTHORIZATION=f'Basic {bad}')
+            self.assertEqual(authenticate.call_count, 2)
+            # после смены пароля запомненный вход недействителен
+            reader = User.objects.get(pk=self.reader.pk)
+            reader.set_password('changed')
+            reader.save()
+            response = self.client.get(
+                url, HTTP_AUTHORIZATION=f'Basic {good}')
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(authenticate.call_count, 3)
+
+    def test_session_writes_check_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(
+            reverse('api:post_list'), json.dumps({'text': 'Без токена'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_only_author_edits_post(self):
+        reader = Client()
+        reader.force_login(self.reader)
+        url = reverse('api:post_detail', kwargs={'post_id': self.posts[0].pk})
+        self.assertEqual(reader.delete(url).status_code, 403)
+        self.assertEqual(self.author_client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comments(self):
+        post = self.posts[0]
+        url = reverse('api:comment_list', kwargs={'post_id': post.pk})
+        response = self.author_client.post(
+            url, json.dumps({'text': 'Комментарий'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        data = self.get_json(url)
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+        self.assertEqual(Comment.objects.filter(post=post).count(), 1)
+        parent = data['results'][0]['id']
+        response = self.author_client.post(
+            url, json.dumps({'text': 'Ответ', 'parent': parent}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            (response.json()['parent'], response.json()['depth']),
+            (parent, 1))
+        response = self.author_client.post(
+            url, json.dumps({'text': 'Ответ', 'parent': 'x'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_groups(self):
+        data = self.get_json(reverse('api:group_list'))
+        self.assertEqual(data['results'][0]['slug'], 'group')
+        data = self.get_json(
+            reverse('api:group_detail', kwargs={'slug': 'group'}))
+        self.assertEqual(data['title'], 'Группа')
+
+    def test_follows(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('api:follow_list')
+        response = client.post(
+            url, json.dumps({'author': 'author'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            client.get(url).json()['results'][0]['author'], 'author')
+        response = client.delete(
+            reverse('api:follow_detail', kwargs={'username': 'author'}))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_etag_does_not_bypass_authentication(self):
+        url = reverse('api:follow_list')
+        etag = self.author_client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 401)
+
+    def test_renames_change_etag(self):
+        url = reverse('api:post_list')
+        renames = [
+            (User.objects.get(pk=self.author.pk), 'username', 'writer'),
+            (Group.objects.get(pk=self.group.pk), 'title', 'Новая группа'),
+        ]
+        for instance, field, value in renames:
+            with self.subTest(field=field):
+                etag = self.client.get(url)['ETag']
+                setattr(instance, field, value)
+                instance.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        # вход меняет только last_login
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        self.client.logout()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
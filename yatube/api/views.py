@@ -0,0 +1,337 @@
+import base64
+import binascii
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.views.decorators.csrf import csrf_exempt
+
+from posts.conditional import conditional
+from posts.forms import CommentForm, PostForm
+from posts.models import Follow, Group, Post, User
+from posts.utils import CursorPaginator, InvalidCursor
+
+from .serializers import (CommentSerializer, FollowSerializer,
+                          GroupSerializer, PostSerializer, UnknownFields)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def json_response(request, data, status=200):
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return HttpResponse(body, status=status, content_type='application/json')
+
+
+def api_validator(request, *args, **kwargs):
+    # данные API меняются вместе с отметкой changed_at(), которая уже
+    # входит в ETag вместе с адресом и пользователем
+    return (), None
+
+
+def error_response(request, status, detail):
+    response = json_response(request, {'detail': detail}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Basic realm="api"'
+    return response
+
+
+def authenticate_basic(request):
+    """HTTP Basic для мобильных клиентов. Возвращает None, если
+    заголовка нет или пользователь уже вошёл через сессию, и False при
+    неверных данных.
+
+    Клиент присылает пароль с каждым запросом, а его хеширование
+    нарочно медленное, поэтому результат проверки (и неудачной тоже)
+    запоминается в кеше на API_AUTH_CACHE_TIMEOUT секунд под HMAC от
+    учётных данных. Смена пароля делает запомненный вход
+    недействительным."""
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() != 'basic' or request.user.is_authenticated:
+        return None
+    try:
+        decoded = base64.b64decode(credentials, validate=True).decode()
+    except (ValueError, binascii.Error):
+        return False
+    key = 'api:basic:' + salted_hmac(
+        'api.views.authenticate_basic', decoded).hexdigest()
+    cached = cache.get(key)
+    if cached == 0:
+        return False
+    user = None
+    if cached is not None:
+        pk, auth_hash = cached
+        user = User.objects.filter(pk=pk, is_active=True).first()
+        if user is not None and not constant_time_compare(
+                user.get_session_auth_hash(), auth_hash):
+            user = None
+    if user is None:
+        username, _, password = decoded.partition(':')
+        user = authenticate(request, username=username, password=password)
+        cache.set(
+            key,
+            0 if user is None else (user.pk, user.get_session_auth_hash()),
+            settings.API_AUTH_CACHE_TIMEOUT,
+        )
+    if user is None:
+        return False
+    request.user = user
+    return user
+
+
+def check_access(request, login_required=False):
+    """Ответ с ошибкой, если запрос нельзя выполнить, иначе None."""
+    basic = authenticate_basic(request)
+    if basic is False:
+        return error_response(request, 401, 'Неверные учётные данные')
+    if request.method in SAFE_METHODS and not login_required:
+        return None
+    if not request.user.is_authenticated:
+        return error_response(request, 401, 'Требуется аутентификация')
+    if request.method in SAFE_METHODS:
+        return None
+    if basic is None and CsrfViewMiddleware().process_view(
+            request, None, (), {}):
+        return error_response(request, 403, 'Ошибка CSRF')
+    return None
+
+
+def api_view(*methods, login_required=False):
+    """Обёртка JSON-эндпоинтов: разрешённые методы, аутентификация
+    и ошибки в виде JSON. Запись требует входа, а с
+    ``login_required`` — и чтение; при сессионной аутентификации CSRF
+    проверяется как у обычных форм. Доступ проверяется до ETag, иначе
+    клиент без входа получил бы 304 вместо 401."""
+    allowed = set(methods)
+    if 'GET' in allowed:
+        allowed.add('HEAD')
+
+    def decorator(view):
+        # ETag считается до выборки и сериализации: совпавший сразу
+        # даёт 304
+        conditional_view = conditional(api_validator)(view)
+
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = error_response(
+                    request, 405, 'Метод не поддерживается')
+                response['Allow'] = ', '.join(sorted(allowed))
+                return response
+            denied = check_access(request, login_required)
+            if denied is not None:
+                return denied
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except ApiError as error:
+                return error_response(request, error.status, error.detail)
+            except Http404:
+                return error_response(request, 404, 'Не найдено')
+            except PermissionDenied:
+                return error_response(request, 403, 'Доступ запрещён')
+        return wrapper
+    return decorator
+
+
+def get_serializer(serializer_class, request):
+    try:
+        return serializer_class.from_request(request)
+    except UnknownFields as error:
+        raise ApiError(400, 'Неизвестные поля: ' + ', '.join(error.args[0]))
+
+
+def parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Некорректный JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Ожидается JSON-объект')
+    return data
+
+
+def form_errors(form):
+    return ApiError(400, form.errors)
+
+
+def paginated(request, serializer, queryset):
+    """Страница выдачи с курсорами на соседние страницы."""
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'Некорректный limit')
+    limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+    paginator = CursorPaginator(
+        serializer.rows(queryset), limit, serializer.ordering)
+    cursor = request.GET.get('cursor')
+    try:
+        page = (
+            paginator.cursor_page(cursor) if cursor
+            else paginator.first_page()
+        )
+    except InvalidCursor:
+        raise ApiError(400, 'Некорректный курсор')
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        return f'{request.path}?{query.urlencode()}'
+
+    return json_response(request, {
+        'next': link(paginator.next_cursor),
+        'previous': link(paginator.previous_cursor),
+        'results': serializer.many(page.object_list),
+    })
+
+
+def post_form_data(data, post=None):
+    """Данные для PostForm: группа передаётся slug'ом, а при
+    частичном обновлении недостающие поля берутся из поста."""
+    if post is not None:
+        data.setdefault('text', post.text)
+        if 'group' not in data:
+            data['group'] = post.group_id
+            return data
+    slug = data.get('group')
+    if slug:
+        group = Group.objects.filter(slug=slug).values_list(
+            'pk', flat=True).first()
+        if group is None:
+            raise ApiError(400, {'group': ['Группа не найдена']})
+        data['group'] = group
+    return data
+
+
+@api_view('GET', 'POST')
+def post_list(request):
+    serializer = get_serializer(PostSerializer, request)
+    if request.method == 'POST':
+        form = PostForm(post_form_data(parse_body(request)))
+        if not form.is_valid():
+            raise form_errors(form)
+        post = form.save(commit=False)
+        post.author = request.user
+        post.save()
+        return json_response(
+            request, serializer.one(Post.objects.filter(pk=post.pk)), 201)
+    posts = Post.objects.all()
+    if 'group' in request.GET:
+        posts = posts.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        posts = posts.filter(author__username=request.GET['author'])
+    return paginated(request, serializer, posts)
+
+
+@api_view('GET', 'PUT', 'PATCH', 'DELETE')
+def post_detail(request, post_id):
+    serializer = get_serializer(PostSerializer, request)
+    posts = Post.objects.filter(pk=post_id)
+    if request.method in SAFE_METHODS:
+        data = serializer.one(posts)
+        if data is None:
+            raise Http404
+        return json_response(request, data)
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        raise PermissionDenied
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    data = parse_body(request)
+    form = PostForm(
+        post_form_data(data, post if request.method == 'PATCH' else None),
+        instance=post,
+    )
+    if not form.is_valid():
+        raise form_errors(form)
+    form.save()
+    return json_response(request, serializer.one(posts))
+
+
+@api_view('GET', 'POST')
+def comment_list(request, post_id):
+    serializer = get_serializer(CommentSerializer, request)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'POST':
+        data = parse_body(request)
+        form = CommentForm(data)
+        if not form.is_valid():
+            raise form_errors(form)
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        parent = data.get('parent')
+        if parent is not None:
+            if isinstance(parent, int):
+                comment.parent = post.comments.filter(pk=parent).first()
+            if comment.parent is None:
+                raise ApiError(400, {'parent': ['Комментарий не найден']})
+        comment.save()
+        return json_response(
+            request,
+            serializer.one(post.comments.filter(pk=comment.pk)),
+            201,
+        )
+    return paginated(request, serializer, post.comments.all())
+
+
+@api_view('GET')
+def group_list(request):
+    return paginated(
+        request, get_serializer(GroupSerializer, request), Group.objects.all())
+
+
+@api_view('GET')
+def group_detail(request, slug):
+    data = get_serializer(GroupSerializer, request).one(
+        Group.objects.filter(slug=slug))
+    if data is None:
+        raise Http404
+    return json_response(request, data)
+
+
+@api_view('GET', 'POST', login_required=True)
+def follow_list(request):
+    serializer = get_serializer(FollowSerializer, request)
+    follows = Follow.objects.filter(user=request.user)
+    if request.method == 'POST':
+        username = parse_body(request).get('author')
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise ApiError(400, {'author': ['Автор не найден']})
+        if author == request.user:
+            raise ApiError(400, {'author': ['Нельзя подписаться на себя']})
+        follow, created = Follow.objects.get_or_create(
+            user=request.user, author=author)
+        return json_response(
+            request,
+            serializer.one(follows.filter(pk=follow.pk)),
+            201 if created else 200,
+        )
+    return paginated(request, serializer, follows)
+
+
+@api_view('DELETE')
+def follow_detail(request, username):
+    follow = get_object_or_404(
+        Follow, user=request.user, author__username=username)
+    follow.delete()
+    return HttpResponse(status=204)
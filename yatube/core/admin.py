@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'priority', 'run_at', 'attempts', 'locked_by',
+        'failed_at',)
+    list_filter = ('name', 'failed_at',)
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,300 @@
+"""ASGI-приложение для Django 2.2 (yatube/asgi.py).
+
+Django до 3.0 не умеет ASGI, поэтому адаптер свой. Тело запроса
+читается и ответ отправляется в цикле событий, а синхронный код —
+middleware, view, ORM, шаблоны — выполняется в пуле из
+``ASGI_THREADS`` потоков. Медленный клиент занимает поток только на
+время работы view, а не на всё время передачи.
+
+View из ``ASGI_VIEWS`` (имя URL → путь к корутине) вызываются прямо в
+цикле событий без middleware и сами отдают блокирующую работу в пул
+через ``run_sync()``. Так под ASGI работают долгие соединения, которые
+в WSGI держат по потоку на клиента. Остальные URL и WSGI-развёртывание
+(yatube/wsgi.py) обслуживает обычный обработчик Django.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.db import close_old_connections
+from django.http.response import HttpResponseBase
+from django.urls import Resolver404, get_resolver, set_script_prefix
+from django.utils.module_loading import import_string
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_THREADS, thread_name_prefix='asgi')
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def call(func, args, kwargs):
+    # как request_started в WSGI: соединения пула не живут дольше
+    # CONN_MAX_AGE и не остаются сломанными
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run_sync(func, *args, **kwargs):
+    """Выполняет синхронный код в пуле потоков и ждёт результат. При
+    ASGI_THREADS = 0 — сразу в цикле событий."""
+    if not settings.ASGI_THREADS:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor(), partial(call, func, args, kwargs))
+
+
+def authenticate(request):
+    """Сессия и пользователь для асинхронного view, как у
+    SessionMiddleware и AuthenticationMiddleware, только для чтения.
+    Вызывается через run_sync()."""
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    request.user = auth.get_user(request)
+    return request.user
+
+
+class AsyncStreamingHttpResponse(HttpResponseBase):
+    """Потоковый ответ асинхронного view: ``content`` — асинхронный
+    итератор строк или байтов."""
+    streaming = True
+
+    def __init__(self, content, *args, on_close=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_content = content
+        self.on_close = on_close
+
+    async def chunks(self):
+        async for chunk in self.async_content:
+            yield self.make_bytes(chunk)
+
+    async def aclose(self):
+        """Обработчик вызывает её, когда ответ отправлен или клиент
+        ушёл, даже если поток так и не начали читать: тогда finally
+        генератора не выполнится, и освобождать ресурсы должен
+        ``on_close``."""
+        if hasattr(self.async_content, 'aclose'):
+            await self.async_content.aclose()
+        if self.on_close is not None:
+            self.on_close()
+
+
+def make_environ(scope, body):
+    """WSGI environ из scope ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+def encode_headers(headers):
+    return [
+        (name.encode('latin-1'), value.encode('latin-1'))
+        for name, value in headers
+    ]
+
+
+async def read_body(receive):
+    """Тело запроса; большое уходит во временный файл. None — клиент
+    отключился, не дослав его."""
+    body = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body', False):
+            body.seek(0)
+            return body
+
+
+async def disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class ASGIHandler:
+    def __init__(self):
+        self.wsgi = WSGIHandler()
+        self.async_views = {
+            name: import_string(path)
+            for name, path in settings.ASGI_VIEWS.items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(
+                f'Неподдерживаемый тип соединения {scope["type"]}')
+        body = await read_body(receive)
+        if body is None:
+            return
+        try:
+            environ = make_environ(scope, body)
+            match = self.resolve(environ['PATH_INFO'])
+            if match is None:
+                await self.handle_sync(environ, send)
+            else:
+                await self.handle_async(environ, match, receive, send)
+        finally:
+            body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def resolve(self, path):
+        if not self.async_views:
+            return None
+        try:
+            match = get_resolver().resolve(path)
+        except Resolver404:
+            return None
+        if match.view_name not in self.async_views:
+            return None
+        return match
+
+    async def handle_sync(self, environ, send):
+        started = []
+
+        def start_response(status, headers):
+            started.append((int(status.split(' ', 1)[0]), headers))
+
+        response = await run_sync(self.wsgi, environ, start_response)
+        status, headers = started[0]
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': encode_headers(headers),
+            })
+            if response.streaming:
+                iterator = iter(response)
+                while True:
+                    chunk = await run_sync(next, iterator, None)
+                    if chunk is None:
+                        break
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+                await send({'type': 'http.response.body'})
+            else:
+                await send({
+                    'type': 'http.response.body',
+                    'body': response.content,
+                })
+        finally:
+            # request_finished и закрытие файлов ответа
+            await run_sync(response.close)
+
+    async def handle_async(self, environ, match, receive, send):
+        set_script_prefix(environ['SCRIPT_NAME'] or '/')
+        request = WSGIRequest(environ)
+        request.resolver_match = match
+        try:
+            response = await self.async_views[match.view_name](
+                request, *match.args, **match.kwargs)
+        except Exception as exc:
+            response = await run_sync(response_for_exception, request, exc)
+        if not isinstance(response, AsyncStreamingHttpResponse):
+            await self.send_start(response, send)
+            await send({
+                'type': 'http.response.body',
+                'body': response.content,
+            })
+            return
+        try:
+            await self.send_start(response, send)
+            streaming = asyncio.ensure_future(self.stream(response, send))
+            disconnect = asyncio.ensure_future(disconnected(receive))
+            await asyncio.wait(
+                [streaming, disconnect],
+                return_when=asyncio.FIRST_COMPLETED)
+            disconnect.cancel()
+            # отключение клиента прерывает поток
+            streaming.cancel()
+            try:
+                await streaming
+            except asyncio.CancelledError:
+                pass
+        finally:
+            await response.aclose()
+
+    async def send_start(self, response, send):
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': encode_headers([
+                *response.items(),
+                *(('Set-Cookie', cookie.output(header=''))
+                  for cookie in response.cookies.values()),
+            ]),
+        })
+
+    async def stream(self, response, send):
+        async for chunk in response.chunks():
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body'})
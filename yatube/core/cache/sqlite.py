@@ -0,0 +1,277 @@
+"""Кеш в общем файле SQLite.
+
+Все процессы gunicorn открывают один и тот же файл, поэтому кеш общий
+и не остывает при добавлении воркеров. Файл работает в режиме WAL и
+читается через mmap, записи вытесняются по давности последнего
+обращения (LRU), если превышены MAX_ENTRIES или MAX_SIZE.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.sqlite.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.middleware.instrumentation import record_cache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET entries = entries + 1, size = size + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET entries = entries - 1, size = size - old.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE cache_stats SET size = size + new.size - old.size;
+END;
+'''
+
+UPSERT = '''
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+'''
+
+ADD = '''
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO NOTHING
+'''
+
+# Не чаще, чем раз в столько секунд, обновляем время обращения к записи,
+# чтобы чтение почти никогда не превращалось в запись.
+TOUCH_RESOLUTION = 1.0
+# Границы INTEGER SQLite
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._mmap_size = int(options.get('MMAP_SIZE', 64 * 2 ** 20))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и процесса: после fork
+        # унаследованное соединение использовать нельзя.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.pid = os.getpid()
+            local.db = self._connect()
+        return local.db
+
+    def _connect(self):
+        db = sqlite3.connect(
+            self._path, timeout=self._busy_timeout, isolation_level=None,
+            check_same_thread=False,
+        )
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        db.execute(f'PRAGMA mmap_size = {self._mmap_size}')
+        db.executescript(SCHEMA)
+        return db
+
+    def _encode(self, value):
+        # Целые числа храним как есть, чтобы incr() работал в SQL;
+        # не влезающие в INTEGER SQLite (64 бита) — через pickle.
+        if type(value) is int and INT_MIN <= value <= INT_MAX:
+            return value
+        return sqlite3.Binary(pickle.dumps(value, self.pickle_protocol))
+
+    @staticmethod
+    def _size(encoded):
+        return 8 if isinstance(encoded, int) else len(encoded)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(keys)),
+            [*keys, now],
+        ).fetchall()
+        stale = [row[0] for row in rows if row[2] < now - TOUCH_RESOLUTION]
+        if stale:
+            self._db.execute(
+                'UPDATE cache SET accessed = ? WHERE key IN (%s)'
+                % ', '.join('?' * len(stale)),
+                [now, *stale],
+            )
+        record_cache(len(rows), len(keys) - len(rows))
+        return {keys[row[0]]: self._decode(row[1]) for row in rows}
+
+    def _write(self, sql, key, value, timeout):
+        value = self._encode(value)
+        cursor = self._db.execute(
+            sql, (key, value, self.get_backend_timeout(timeout),
+                  time.time(), self._size(value))
+        )
+        self._cull()
+        return cursor.rowcount
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(UPSERT, self._key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for key, value in data.items():
+                self.set(key, value, timeout, version)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            (key, time.time()),
+        )
+        return self._write(ADD, key, value, timeout) == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self._decode(row[0]) + delta
+            encoded = self._encode(value)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?',
+                (encoded, self._size(encoded), time.time(), key),
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(keys)), keys,
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        db = self._db
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        over_entries = entries > self._max_entries
+        over_size = self._max_size and size > self._max_size
+        if not over_entries and not over_size:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        if entries > self._max_entries or (
+                self._max_size and size > self._max_size):
+            # Как и встроенные бэкенды, освобождаем сразу 1/CULL_FREQUENCY
+            # записей, начиная с давно не читанных.
+            count = max(entries // self._cull_frequency, 1)
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (count,),
+            )
+
+    def stats(self):
+        entries, size = self._db.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        return {'entries': entries, 'size': size}
+
+    def close(self, **kwargs):
+        # Соединение остаётся открытым между запросами: открытие файла
+        # и чтение схемы дороже самих операций с кешем.
+        pass
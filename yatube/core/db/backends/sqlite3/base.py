@@ -0,0 +1,183 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+Дополнительные ключи OPTIONS (остальные передаются sqlite3.connect):
+
+* ``journal_mode``, ``synchronous``, ``mmap_size``, ``cache_size``,
+  ``temp_store`` — PRAGMA, которые выполняются при открытии соединения;
+* ``transaction_mode`` — ``IMMEDIATE`` начинает пишущие транзакции
+  сразу с блокировки на запись;
+* ``serialize_writes`` — запись соединений процесса к одному файлу
+  идёт по очереди, в порядке прихода. Потоки одного процесса ждут в
+  очереди, а не в цикле повторов busy timeout SQLite.
+
+Очередь берётся на уровне запросов записи (INSERT, UPDATE, DELETE,
+DDL). Запись вне транзакции держит её на время запроса. BEGIN
+транзакции atomic() откладывается до её первого запроса: если это
+запись, транзакция начинается с очереди и ``BEGIN IMMEDIATE``, если
+чтение — с обычного BEGIN, без очереди и блокировки, так что читающие
+транзакции не мешают писателям. Когда такая транзакция доходит до
+записи, она встаёт в очередь и держит её до конца. Если между её
+первым чтением и записью базу успело изменить другое соединение,
+SQLite ответит «database is locked» без ожидания. Транзакции, которые
+читают перед записью, поэтому открываются через
+core.db.transactions.atomic_write(): они сразу начинаются как пишущие.
+
+Время ожидания чужой записи задаёт стандартный ключ ``timeout``
+(секунды), повторное использование соединений — ``CONN_MAX_AGE``.
+"""
+import re
+import threading
+from contextlib import contextmanager
+
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size',
+           'temp_store')
+WRITE = re.compile(
+    r'\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+
+class WriteQueue:
+    """Очередь на запись: билеты выдаются по порядку, обслуживаются
+    по одному. Поток, который уже стоит у окна, проходит без очереди."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next = 0
+        self._serving = 0
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return
+            ticket = self._next
+            self._next += 1
+            while ticket != self._serving:
+                self._condition.wait()
+            self._owner = me
+            self._depth = 1
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth:
+                return
+            self._owner = None
+            self._serving += 1
+            self._condition.notify_all()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def write_queue(database):
+    with _queues_lock:
+        return _queues.setdefault(database, WriteQueue())
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+    database = None
+
+    def execute(self, query, params=None):
+        with self.database.writing(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.database.writing(query):
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    write_queue = None
+    in_write_queue = False
+    begin_pending = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = [
+            (name, params.pop(name)) for name in PRAGMAS if name in params]
+        self.transaction_mode = params.pop('transaction_mode', '')
+        if params.pop('serialize_writes', False):
+            self.write_queue = write_queue(params['database'])
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.database = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        # BEGIN выполнит первый запрос транзакции (writing())
+        self.begin_pending = True
+
+    def begin_write(self):
+        """Начинает отложенную транзакцию как пишущую: очередь и
+        BEGIN IMMEDIATE."""
+        if self.begin_pending:
+            self._begin(write=True)
+
+    def _begin(self, write):
+        self.begin_pending = False
+        if write:
+            self._enter_write_queue()
+        try:
+            mode = self.transaction_mode if write else ''
+            self.connection.execute(f'BEGIN {mode}'.strip())
+        except Exception:
+            self._leave_write_queue()
+            raise
+
+    @contextmanager
+    def writing(self, query):
+        write = WRITE.match(query) is not None
+        if self.begin_pending:
+            self._begin(write)
+        if not write or self.write_queue is None or self.in_write_queue:
+            yield
+        elif self.connection.in_transaction:
+            # транзакция начиналась с чтения: очередь до её конца
+            self._enter_write_queue()
+            yield
+        else:
+            self.write_queue.acquire()
+            try:
+                yield
+            finally:
+                self.write_queue.release()
+
+    def _enter_write_queue(self):
+        if self.write_queue is not None and not self.in_write_queue:
+            self.write_queue.acquire()
+            self.in_write_queue = True
+
+    def _leave_write_queue(self):
+        if self.in_write_queue:
+            self.in_write_queue = False
+            self.write_queue.release()
+
+    def _end_transaction(self, end):
+        self.begin_pending = False
+        try:
+            return end()
+        finally:
+            self._leave_write_queue()
+
+    def _commit(self):
+        return self._end_transaction(super()._commit)
+
+    def _rollback(self):
+        return self._end_transaction(super()._rollback)
+
+    def _close(self):
+        return self._end_transaction(super()._close)
@@ -0,0 +1,76 @@
+"""Чтение с реплик.
+
+Запросы на чтение к моделям приложений из ``REPLICA_APPS`` уходят на
+случайную реплику из ``DATABASE_REPLICAS``, но только после
+``use_replicas()``: его вызывает core.middleware.replicas для
+GET-запросов к view из ``REPLICA_VIEWS``. Всё остальное — команды,
+сигналы, формы, запросы внутри транзакции — читает с основной базы.
+Запись в таблицы тех же приложений переключает текущий запрос на
+основную базу и отмечается в ``wrote()``, чтобы middleware закрепил
+клиента за ней на время отставания реплик. Запись в служебные таблицы
+(сессии, очередь задач, кэш миниатюр) с реплик не читается и клиента
+не закрепляет.
+
+Локально реплики заменяются тем же файлом SQLite, открытым только для
+чтения (YATUBE_SQLITE_REPLICAS в settings.py): данные не отстают, но
+ошибочно направленная на реплику запись падает.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def begin():
+    """Начало запроса: чтение с основной базы, записей не было."""
+    _local.replica = False
+    _local.wrote = False
+
+
+def use_replicas():
+    """Дальнейшее чтение запроса можно отдать репликам."""
+    _local.replica = True
+
+
+def end():
+    _local.replica = False
+
+
+def wrote():
+    """Была ли запись с начала запроса."""
+    return getattr(_local, 'wrote', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not getattr(_local, 'replica', False):
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in settings.REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        # незафиксированные изменения видны только на основной базе
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = settings.DATABASE_REPLICAS
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in settings.REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        _local.replica = False
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # на репликах те же данные, что и на основной базе
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
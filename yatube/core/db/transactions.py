@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextmanager
+def atomic_write(using=None):
+    """transaction.atomic() для транзакции, которая читает перед
+    записью. На core.db.backends.sqlite3 она сразу берёт очередь записи
+    и блокировку (BEGIN IMMEDIATE), иначе запись после чтения может
+    получить «database is locked». На других бэкендах — обычный
+    atomic()."""
+    using = using or DEFAULT_DB_ALIAS
+    with transaction.atomic(using=using):
+        begin_write = getattr(connections[using], 'begin_write', None)
+        if begin_write is not None:
+            begin_write()
+        yield
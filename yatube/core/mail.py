@@ -0,0 +1,70 @@
+"""Отправка почты через очередь задач (core/tasks.py).
+
+``EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'`` только ставит письма
+в очередь: запрос (например, сброс пароля) не ждёт SMTP. Воркер
+отправляет их пачками через одно соединение бэкенда
+``TASK_EMAIL_BACKEND``. Повтор пачки после ошибки может отправить
+часть писем ещё раз. Вложения — только кортежи (имя, содержимое, тип).
+"""
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .tasks import task
+
+
+def serialize(message):
+    attachments = []
+    for attachment in message.attachments:
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append(
+            [filename, base64.b64encode(content).decode(), mimetype])
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'alternatives': getattr(message, 'alternatives', []),
+        'attachments': attachments,
+        'content_subtype': message.content_subtype,
+    }
+
+
+def deserialize(data):
+    message = EmailMultiAlternatives(
+        subject=data['subject'],
+        body=data['body'],
+        from_email=data['from_email'],
+        to=data['to'],
+        cc=data['cc'],
+        bcc=data['bcc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+        alternatives=[tuple(item) for item in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+@task(priority=20, batch_size=50)
+def send(items):
+    messages = [deserialize(item['message']) for item in items]
+    with get_connection(settings.TASK_EMAIL_BACKEND) as connection:
+        connection.send_messages(messages)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            send.delay(message=serialize(message))
+        return len(email_messages)
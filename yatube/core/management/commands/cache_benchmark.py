@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache.sqlite.SQLiteCache',
+}
+
+
+def run_worker(backend, location, keys, operations, seed):
+    """Имитирует воркер gunicorn: читает популярные ключи,
+    а при промахе «рендерит» страницу и кладёт её в кеш."""
+    cache = import_string(backend)(
+        location, {'OPTIONS': {'MAX_ENTRIES': keys}})
+    rnd = random.Random(seed)
+    page = 'x' * 2048
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f'page:{min(int(rnd.paretovariate(0.5)), keys)}'
+        if cache.get(key) is None:
+            cache.set(key, page, 300)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает долю попаданий в кеш у LocMemCache и SQLiteCache '
+            'при нескольких процессах-воркерах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+',
+                            default=[1, 2, 4, 8])
+        parser.add_argument('--keys', type=int, default=5000)
+        parser.add_argument('--operations', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"backend":<8} {"workers":>7} {"hit rate":>9} {"ops/s":>10}')
+        for name, backend in BACKENDS.items():
+            for workers in options['workers']:
+                hit_rate, speed = self.measure(
+                    backend, workers, options['keys'], options['operations'])
+                self.stdout.write(
+                    f'{name:<8} {workers:>7} {hit_rate:>9.1%} {speed:>10.0f}')
+
+    def measure(self, backend, workers, keys, operations):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            jobs = [
+                (backend, location, keys, operations, seed)
+                for seed in range(workers)
+            ]
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.starmap(run_worker, jobs)
+        hits = sum(result[0] for result in results)
+        elapsed = max(result[1] for result in results)
+        total = workers * operations
+        return hits / total, total / elapsed
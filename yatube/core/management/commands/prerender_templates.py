@@ -0,0 +1,60 @@
+"""Сборка вариантов шапки и подвала для {% prerendered %}.
+
+Шапка собирается для каждого именованного URL проекта, для гостя и для
+вошедшего пользователя, подвал — для текущего года. Запускается при
+выкладке после collectstatic; варианты, которых нет в файле, процесс
+всё равно отрендерит при первом запросе.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+from core import prerender
+
+
+def view_names(patterns=None, namespace=''):
+    """Имена всех URL вида 'posts:index', как в resolver_match."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            # страницы админки не наследуют base.html
+            if pattern.namespace == 'admin':
+                continue
+            inner = namespace
+            if pattern.namespace:
+                inner = f'{namespace}{pattern.namespace}:'
+            yield from view_names(pattern.url_patterns, inner)
+        elif pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+def fragments():
+    names = sorted(set(view_names()))
+    return {
+        'includes/header.html': (
+            [{'authenticated': authenticated, 'view_name': name}
+             for authenticated in (False, True) for name in names],
+            ('username',),
+        ),
+        'includes/footer.html': (
+            [{'year': timezone.now().year}],
+            (),
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Рендерит варианты шапки и подвала в PRERENDERED_FRAGMENTS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=None,
+            help='Файл вместо settings.PRERENDERED_FRAGMENTS',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.PRERENDERED_FRAGMENTS
+        built = prerender.build(fragments(), path)
+        self.stdout.write(f'Собрано вариантов: {built} в {path}')
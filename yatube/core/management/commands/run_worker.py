@@ -0,0 +1,75 @@
+"""Воркер очереди фоновых задач (core/tasks.py).
+
+Берёт готовые задачи по приоритету, пачками для задач с batch_size,
+и выполняет их, пока его не остановят. По SIGTERM или Ctrl+C
+дорабатывает текущую пачку и выходит. Воркеров можно запускать
+несколько: задачи занимаются арендой и не выполняются дважды, пока
+аренда не истекла.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется',
+        )
+        parser.add_argument(
+            '--max-tasks', type=int, default=0,
+            help='Выйти после стольких задач; 0 — без ограничения',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.TASK_POLL_INTERVAL,
+            help='Пауза, когда очередь пуста, секунды',
+        )
+        parser.add_argument('--name', help='Имя воркера в locked_by')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            done, failed = self.work(Worker(options['name']), options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done - failed}, с ошибками: {failed}'))
+
+    def work(self, worker, options):
+        done = failed = 0
+        while not self.stopping:
+            close_old_connections()
+            started = time.perf_counter()
+            name, count, ok = worker.run_once()
+            if not count:
+                if options['burst']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            done += count
+            failed += 0 if ok else count
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'{name}: {count} шт. за '
+                    f'{(time.perf_counter() - started) * 1000:.1f} мс'
+                    f'{"" if ok else ", с ошибкой"}')
+            if options['max_tasks'] and done >= options['max_tasks']:
+                break
+        return done, failed
+
+    def stop(self, signum, frame):
+        self.stopping = True
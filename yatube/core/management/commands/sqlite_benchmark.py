@@ -0,0 +1,187 @@
+"""Конкурентная запись в SQLite: стандартный бэкенд против
+core.db.backends.sqlite3 с настройками из settings.SQLITE_OPTIONS.
+
+Каждый профиль получает свою копию базы. Воркеры — отдельные процессы
+(как воркеры gunicorn), в каждом несколько потоков; поток повторяет
+то же, что view add_comment, post_create и index: читает пост и пишет
+комментарий, публикует пост (с раскладкой по лентам и индексом поиска)
+или читает страницу ленты. После каждой операции соединение
+закрывается по правилам CONN_MAX_AGE, как в конце запроса.
+"""
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (OperationalError, close_old_connections,
+                       connections)
+from django.test import override_settings
+
+from core.middleware.instrumentation import percentile
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+PROFILES = ('stock', 'tuned')
+
+
+def profile_settings(name, path):
+    database = dict(connections.databases['default'], NAME=path)
+    if name == 'stock':
+        database.update(
+            ENGINE='django.db.backends.sqlite3', OPTIONS={}, CONN_MAX_AGE=0)
+    return database
+
+
+def copy_database(source, target, journal_mode):
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+        dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+    src.close()
+    dst.close()
+
+
+def comment(rnd, pools):
+    post = Post.objects.get(pk=rnd.choice(pools['posts']))
+    Comment.objects.create(
+        post=post, author_id=rnd.choice(pools['users']), text='Комментарий')
+
+
+def publish(rnd, pools):
+    Post.objects.create(
+        author_id=rnd.choice(pools['users']), text='Пост из замера')
+
+
+def read(rnd, pools):
+    list(Post.objects.for_feed()[:settings.COUNT_POSTS])
+
+
+def run_thread(seed, pools, write_ratio, stop_at, result):
+    rnd = random.Random(seed)
+    while time.time() < stop_at:
+        if rnd.random() < write_ratio:
+            kind, operation = 'write', rnd.choice((comment, publish))
+        else:
+            kind, operation = 'read', read
+        started = time.perf_counter()
+        try:
+            operation(rnd, pools)
+        except OperationalError as error:
+            result['errors'][str(error)] += 1
+        else:
+            result[kind].append(time.perf_counter() - started)
+        close_old_connections()
+    connections.close_all()
+
+
+def run_worker(database, pools, threads, write_ratio, start_at, stop_at,
+               seed):
+    """Процесс-воркер: потоки создают соединения уже с настройками
+    профиля, кеш — свой в памяти, чтобы не трогать общий файл."""
+    connections.databases['default'] = database
+    override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}).enable()
+    result = {'read': [], 'write': [], 'errors': Counter()}
+    time.sleep(max(start_at - time.time(), 0))
+    workers = [
+        threading.Thread(target=run_thread, args=(
+            seed * 1000 + number, pools, write_ratio, stop_at, result))
+        for number in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность и ошибки «database is '
+            'locked» стандартного SQLite и настроенного бэкенда')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.5,
+            help='Доля операций записи',
+        )
+        parser.add_argument(
+            '--profile', action='append', choices=PROFILES,
+            help='По умолчанию оба; можно повторять',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        pools = {
+            'posts': list(Post.objects.values_list('pk', flat=True)[:10000]),
+            'users': list(User.objects.values_list('pk', flat=True)[:10000]),
+        }
+        if not pools['posts']:
+            raise CommandError('База пуста, сначала выполните manage.py seed')
+        source = connections.databases['default']['NAME']
+        connections.close_all()
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name in options['profile'] or PROFILES:
+                path = os.path.join(directory, f'{name}.sqlite3')
+                database = profile_settings(name, path)
+                copy_database(
+                    source, path,
+                    database['OPTIONS'].get('journal_mode', 'DELETE'))
+                results[name] = self.measure(database, pools, options)
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'options': options, 'results': results}, file,
+                          indent=2, default=str)
+
+    def measure(self, database, pools, options):
+        start_at = time.time() + 1
+        stop_at = start_at + options['duration']
+        jobs = [
+            (database, pools, options['threads'], options['write_ratio'],
+             start_at, stop_at, options['seed'] * 100 + number)
+            for number in range(options['workers'])
+        ]
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['workers']) as pool:
+            results = pool.starmap(run_worker, jobs)
+        errors = sum((result['errors'] for result in results), Counter())
+        measured = {'errors': dict(errors)}
+        for kind in ('read', 'write'):
+            timings = sorted(
+                timing * 1000 for result in results
+                for timing in result[kind])
+            measured[kind] = {
+                'ops': len(timings),
+                'ops_per_s': len(timings) / options['duration'],
+                'p50_ms': percentile(timings, 0.5),
+                'p99_ms': percentile(timings, 0.99),
+            }
+        return measured
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"profile":<8} {"writes/s":>9} {"p50 ms":>8} {"p99 ms":>9} '
+            f'{"reads/s":>9} {"p99 ms":>9} {"errors":>7}')
+        for name, result in results.items():
+            write, read = result['write'], result['read']
+            self.stdout.write(
+                f'{name:<8} {write["ops_per_s"]:>9.1f} '
+                f'{write["p50_ms"] or 0:>8.1f} {write["p99_ms"] or 0:>9.1f} '
+                f'{read["ops_per_s"]:>9.1f} {read["p99_ms"] or 0:>9.1f} '
+                f'{sum(result["errors"].values()):>7}')
+            for error, count in result['errors'].items():
+                self.stdout.write(f'    {count} × {error}')
@@ -0,0 +1,173 @@
+"""Замеры запроса: число SQL-запросов, время БД и шаблонов, попадания
+в кеш.
+
+Замеры отдаются заголовком ``Server-Timing`` (видны во вкладке Network
+браузера) и накапливаются в процессе по имени URL, откуда считаются
+перцентили (``registry.report()``, страница ``/_instrumentation/``).
+Если ``INSTRUMENTATION_ENFORCE_BUDGETS`` включён (так в тестовых
+настройках yatube/test_settings.py), превышение бюджета из
+``VIEW_BUDGETS`` роняет запрос с ``BudgetExceeded``, а вместе с ним и
+тест.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+_local = threading.local()
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'template_time', 'template_depth',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper()."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record_cache(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class template_timer:
+    """Засекает рендеринг шаблона верхнего уровня; вложенные
+    рендеринги уже входят в его время."""
+
+    def __enter__(self):
+        self.stats = current()
+        if self.stats is not None:
+            self.stats.template_depth += 1
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        stats = self.stats
+        if stats is not None:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - self.start
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Registry:
+    """Последние ``INSTRUMENTATION_SAMPLES`` замеров по каждому URL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(self._new_samples)
+
+    @staticmethod
+    def _new_samples():
+        return deque(maxlen=settings.INSTRUMENTATION_SAMPLES)
+
+    def add(self, name, total, stats):
+        sample = (total, stats.queries, stats.db_time, stats.template_time)
+        with self.lock:
+            self.samples[name].append(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def report(self):
+        with self.lock:
+            samples = {name: list(rows) for name, rows in self.samples.items()}
+        report = {}
+        for name, rows in sorted(samples.items()):
+            totals = sorted(row[0] * 1000 for row in rows)
+            report[name] = {
+                'requests': len(rows),
+                'p50_ms': percentile(totals, 0.5),
+                'p90_ms': percentile(totals, 0.9),
+                'p99_ms': percentile(totals, 0.99),
+                'max_queries': max(row[1] for row in rows),
+                'avg_db_ms': sum(row[2] for row in rows) * 1000 / len(rows),
+                'avg_template_ms': (
+                    sum(row[3] for row in rows) * 1000 / len(rows)),
+            }
+        return report
+
+
+registry = Registry()
+
+
+def check_budget(name, stats):
+    budget = settings.VIEW_BUDGETS.get(name)
+    if not budget:
+        return
+    measured = {
+        'queries': stats.queries,
+        'db_ms': stats.db_time * 1000,
+        'template_ms': stats.template_time * 1000,
+    }
+    exceeded = [
+        f'{key}={measured[key]:g} > {limit}'
+        for key, limit in budget.items() if measured[key] > limit
+    ]
+    if exceeded:
+        raise BudgetExceeded(f'{name}: ' + ', '.join(exceeded))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        registry.add(name, total, stats)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} SQL"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'cache;desc="{stats.cache_hits} hit '
+            f'{stats.cache_misses} miss"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        if settings.INSTRUMENTATION_ENFORCE_BUDGETS:
+            check_budget(name, stats)
+        return response
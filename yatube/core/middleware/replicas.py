@@ -0,0 +1,48 @@
+"""Чтение с реплик для лент и страниц постов (core.db.routers).
+
+GET- и HEAD-запросы к view из ``REPLICA_VIEWS`` читают с реплик. После
+записи клиент получает cookie ``REPLICA_PIN_COOKIE`` и следующие
+``REPLICA_PIN_SECONDS`` секунд читает с основной базы, чтобы увидеть
+собственный пост, комментарий или подписку, пока реплики догоняют.
+Закрепляют только записи в таблицы ``REPLICA_APPS``; middleware стоит
+внутри SessionMiddleware, и сохранение сессии в ответе его не касается.
+"""
+import time
+
+from django.conf import settings
+
+from core.db import routers
+
+
+def pinned(request):
+    try:
+        until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end()
+        if routers.wrote():
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, f'{time.time() + seconds:.3f}',
+                max_age=seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS
+                and not pinned(request)):
+            routers.use_replicas()
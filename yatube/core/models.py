@@ -0,0 +1,47 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class TaskQuerySet(models.QuerySet):
+    def ready(self, now=None):
+        """Задачи, которые можно взять: срок подошёл, не провалены и не
+        заняты воркером (или аренда истекла, воркер упал)."""
+        now = now or timezone.now()
+        return self.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            failed_at__isnull=True,
+            run_at__lte=now,
+        ).order_by('-priority', 'run_at', 'pk')
+
+
+class Task(models.Model):
+    """Фоновая задача (core/tasks.py). Выполненные удаляются, провалившие
+    все попытки остаются с ``failed_at`` и текстом ошибки."""
+    # путь к функции задачи, например posts.search.reindex
+    name = models.CharField(max_length=200)
+    payload = models.TextField(default='{}')
+    # больше — раньше
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['failed_at', '-priority', 'run_at'],
+                name='task_ready_idx',
+            ),
+            models.Index(fields=['locked_by'], name='task_locked_by_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
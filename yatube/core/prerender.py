@@ -0,0 +1,121 @@
+"""Предрендеренные фрагменты шаблонов ({% prerendered %}).
+
+Шапка и подвал одинаковы у всех запросов с одними и теми же ключами
+(вошёл ли пользователь, текущая страница, год), поэтому каждый вариант
+рендерится один раз. Значения, которые различаются у каждого
+пользователя (слоты), рендерятся метками и подставляются при выводе.
+
+Варианты заранее строит manage.py prerender_templates в файл
+``PRERENDERED_FRAGMENTS``; вариант, которого там нет, или шаблон,
+изменённый после сборки, рендерится при первом использовании и
+остаётся в памяти процесса. С ``TEMPLATE_RELOAD`` фрагменты
+рендерятся на каждый запрос, как и без тега.
+"""
+import hashlib
+import json
+import re
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import get_template
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+MARKER = '\x1f{}\x1f'
+MARKERS = re.compile('\x1f(\\w+)\x1f')
+
+_fragments = {}
+_loaded = False
+_lock = threading.Lock()
+
+
+def digest(template_name):
+    source = get_template(template_name).template.source
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+def variant_key(template_name, keys):
+    return template_name, tuple(sorted(keys.items()))
+
+
+def render_parts(template_name, keys, slots):
+    """Рендерит вариант с метками на месте слотов. Возвращает части
+    через одну: текст, имя слота, текст, …"""
+    context = dict(keys)
+    context.update((name, MARKER.format(name)) for name in slots)
+    return MARKERS.split(get_template(template_name).render(context))
+
+
+def join(parts, slots):
+    return mark_safe(''.join(
+        conditional_escape(slots[part]) if index % 2 else part
+        for index, part in enumerate(parts)))
+
+
+def load():
+    """Читает собранные варианты, пропуская шаблоны, изменённые после
+    сборки."""
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        _loaded = True
+        try:
+            with open(settings.PRERENDERED_FRAGMENTS) as file:
+                built = json.load(file)
+        except (OSError, ValueError):
+            return
+        for template_name, entry in built.items():
+            if entry['digest'] != digest(template_name):
+                continue
+            for variant in entry['variants']:
+                key = variant_key(template_name, variant['keys'])
+                _fragments[key] = variant['parts']
+
+
+def render(template_name, keys, slots):
+    if settings.TEMPLATE_RELOAD:
+        context = dict(keys, **slots)
+        return mark_safe(get_template(template_name).render(context))
+    if not _loaded:
+        load()
+    key = variant_key(template_name, keys)
+    parts = _fragments.get(key)
+    if parts is None:
+        parts = _fragments[key] = render_parts(template_name, keys, slots)
+    return join(parts, slots)
+
+
+def build(fragments, path):
+    """Рендерит варианты фрагментов в файл.
+
+    ``fragments`` — {шаблон: (список словарей ключей, имена слотов)}.
+    """
+    built = {}
+    for template_name, (variants, slots) in fragments.items():
+        built[template_name] = {
+            'digest': digest(template_name),
+            'variants': [
+                {'keys': keys,
+                 'parts': render_parts(template_name, keys, slots)}
+                for keys in variants
+            ],
+        }
+    with open(path, 'w') as file:
+        json.dump(built, file, ensure_ascii=False)
+    return sum(len(entry['variants']) for entry in built.values())
+
+
+def clear():
+    global _loaded
+    with _lock:
+        _fragments.clear()
+        _loaded = False
+
+
+@receiver(setting_changed)
+def reset(*, setting, **kwargs):
+    if setting in ('TEMPLATES', 'TEMPLATE_RELOAD', 'PRERENDERED_FRAGMENTS'):
+        clear()
@@ -0,0 +1,232 @@
+"""Очередь фоновых задач в базе проекта, без отдельного брокера.
+
+Задача — функция с декоратором ``@task``; ``func.delay(**payload)``
+записывает её в таблицу core.Task, а ``manage.py run_worker`` выполняет
+вне запроса. Payload — JSON, задачи должны быть идемпотентны: при
+падении воркера или ошибке задача выполнится ещё раз.
+
+- Приоритет: задачи с большим ``priority`` берутся раньше.
+- Повторы: после ошибки задача откладывается на ``TASK_RETRY_DELAY``
+  секунд, удваивая паузу с каждой попыткой (не больше
+  ``TASK_RETRY_MAX_DELAY``); после ``max_attempts`` попыток остаётся
+  в таблице с ``failed_at``.
+- Пачки: с ``batch_size > 1`` воркер берёт до batch_size готовых задач
+  одного типа, и функция получает список их payload.
+- Захват: задачи занимаются арендой на ``TASK_LEASE`` секунд; где
+  база умеет ``SELECT ... FOR UPDATE SKIP LOCKED``, воркеры не ждут
+  друг друга на чужих строках. На SQLite захват — пишущая транзакция
+  (atomic_write), они и так идут по одной.
+
+Задачи, поставленные внутри транзакции, записываются одним INSERT после
+её фиксации, а одинаковые — один раз: каскадное удаление поста с сотней
+комментариев даёт одну задачу переиндексации. При откате транзакции
+задачи не ставятся, при откате вложенного atomic() — только задачи,
+поставленные внутри него.
+
+При ``TASKS_EAGER`` (под тестами) задача выполняется сразу при вызове
+delay().
+"""
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db.transactions import atomic_write
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class TaskFunction:
+    def __init__(self, func, priority, max_attempts, batch_size):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def run(self, payloads):
+        if self.batch_size > 1:
+            return self.func(payloads)
+        payload, = payloads
+        return self.func(**payload)
+
+    def delay(self, *, priority=None, countdown=0, **payload):
+        """Ставит задачу в очередь; ``countdown`` — через сколько
+        секунд её можно выполнять."""
+        if settings.TASKS_EAGER:
+            return self.run([payload])
+        task = Task(
+            name=self.name,
+            payload=json.dumps(payload, sort_keys=True),
+            priority=self.priority if priority is None else priority,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+            max_attempts=self.max_attempts or settings.TASK_MAX_ATTEMPTS,
+        )
+        if connection.in_atomic_block:
+            pending().add(task)
+        else:
+            task.save()
+        return None
+
+
+def task(func=None, *, priority=0, max_attempts=None, batch_size=1):
+    """Делает функцию фоновой задачей:
+
+        @task(priority=10)
+        def send(user_id): ...
+
+        @task(batch_size=100)
+        def reindex(items):  # items — список payload
+            ...
+    """
+    if func is None:
+        return functools.partial(
+            task, priority=priority, max_attempts=max_attempts,
+            batch_size=batch_size)
+    return TaskFunction(func, priority, max_attempts, batch_size)
+
+
+class PendingTasks:
+    """Задачи текущей транзакции до её фиксации.
+
+    Каждая задача ждёт фиксации своим on_commit и пропадает вместе с
+    откаченной точкой сохранения. flush() стоит в run_on_commit
+    последним и не привязан к точкам сохранения: он пишет одним INSERT
+    то, что дошло до фиксации.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, task):
+        transaction.on_commit(functools.partial(self.collect, task))
+        # flush() переносится в конец, вне точек сохранения: при
+        # фиксации он выполнится после collect() всех уцелевших задач
+        hooks = connection.run_on_commit
+        if hooks[-1][1] != self.flush:
+            hooks[:] = [hook for hook in hooks if hook[1] != self.flush]
+            hooks.append((set(), self.flush))
+
+    def collect(self, task):
+        key = task.name, task.payload
+        queued = self.tasks.get(key)
+        if queued is None or task.priority > queued.priority:
+            self.tasks[key] = task
+
+    def flush(self):
+        Task.objects.bulk_create(self.tasks.values())
+        self.tasks = {}
+
+
+def pending():
+    batch = getattr(_local, 'pending', None)
+    # прежний список мог остаться от отменённой или уже зафиксированной
+    # транзакции: его flush() уже не в run_on_commit
+    if batch is None or not any(
+            func == batch.flush for _, func in connection.run_on_commit):
+        batch = _local.pending = PendingTasks()
+    return batch
+
+
+def backoff(attempts):
+    return min(settings.TASK_RETRY_DELAY * 2 ** (attempts - 1),
+               settings.TASK_RETRY_MAX_DELAY)
+
+
+class Worker:
+    def __init__(self, name=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+
+    def claim(self):
+        """Занимает следующую готовую задачу и, если её тип выполняется
+        пачками, другие готовые задачи того же типа. Возвращает функцию
+        задачи и список занятых Task."""
+        now = timezone.now()
+        ready = Task.objects.ready(now)
+        if connection.features.has_select_for_update_skip_locked:
+            ready = ready.select_for_update(skip_locked=True)
+        with atomic_write():
+            while True:
+                first = ready.values_list('pk', 'name').first()
+                if first is None:
+                    return None, []
+                pk, name = first
+                try:
+                    function = import_string(name)
+                except ImportError:
+                    function = None
+                if isinstance(function, TaskFunction):
+                    break
+                Task.objects.filter(pk=pk).update(
+                    failed_at=now, last_error=f'Нет задачи {name}')
+            ids = [pk]
+            if function.batch_size > 1:
+                ids = list(ready.filter(name=name).values_list(
+                    'pk', flat=True)[:function.batch_size])
+            token = f'{self.name}/{uuid.uuid4().hex[:12]}'
+            Task.objects.filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                pk__in=ids,
+            ).update(
+                locked_by=token,
+                locked_until=now + timedelta(seconds=settings.TASK_LEASE),
+                attempts=F('attempts') + 1,
+            )
+        return function, list(Task.objects.filter(locked_by=token))
+
+    def run(self, function, tasks):
+        """Выполняет занятые задачи. Возвращает True при успехе."""
+        try:
+            function.run([json.loads(task.payload) for task in tasks])
+        except Exception:
+            self.retry(tasks, traceback.format_exc())
+            logger.exception(
+                'Задача %s упала (%d шт.)', function.name, len(tasks))
+            return False
+        Task.objects.filter(
+            pk__in=[task.pk for task in tasks],
+            locked_by=tasks[0].locked_by,
+        ).delete()
+        return True
+
+    def retry(self, tasks, error):
+        now = timezone.now()
+        for task in tasks:
+            changes = {
+                'locked_by': None,
+                'locked_until': None,
+                'last_error': error,
+            }
+            if task.attempts >= task.max_attempts:
+                changes['failed_at'] = now
+            else:
+                changes['run_at'] = now + timedelta(
+                    seconds=backoff(task.attempts))
+            Task.objects.filter(
+                pk=task.pk, locked_by=task.locked_by).update(**changes)
+
+    def run_once(self):
+        """Выполняет одну пачку. Возвращает имя задачи, число задач в
+        пачке и успех; (None, 0, True), если готовых задач нет."""
+        function, tasks = self.claim()
+        if not tasks:
+            return None, 0, True
+        return function.name, len(tasks), self.run(function, tasks)
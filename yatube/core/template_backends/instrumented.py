@@ -0,0 +1,26 @@
+"""Бэкенд DjangoTemplates, засекающий время рендеринга для
+core.middleware.instrumentation."""
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (DjangoTemplates, Template,
+                                             reraise)
+
+from core.middleware.instrumentation import template_timer
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with template_timer():
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,49 @@
+from django import template
+from django.template.base import token_kwargs
+
+from core import prerender
+
+register = template.Library()
+
+
+class PrerenderedNode(template.Node):
+    def __init__(self, template_name, keys, slots):
+        self.template_name = template_name
+        self.keys = keys
+        self.slots = slots
+
+    def render(self, context):
+        return prerender.render(
+            self.template_name.resolve(context),
+            {name: value.resolve(context)
+             for name, value in self.keys.items()},
+            {name: value.resolve(context)
+             for name, value in self.slots.items()},
+        )
+
+
+@register.tag
+def prerendered(parser, token):
+    """Фрагмент, отрендеренный один раз для каждого набора ключей:
+
+        {% prerendered 'includes/footer.html' year=year %}
+        {% prerendered 'x.html' key=value slots name=user.username %}
+
+    Ключи (до ``slots``) выбирают вариант и попадают в контекст
+    фрагмента, слоты подставляются в готовый вариант при выводе.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает имя шаблона')
+    template_name = parser.compile_filter(bits[1])
+    key_bits, slot_bits = bits[2:], []
+    if 'slots' in key_bits:
+        index = key_bits.index('slots')
+        key_bits, slot_bits = key_bits[:index], key_bits[index + 1:]
+    keys = token_kwargs(key_bits, parser, support_legacy=False)
+    slots = token_kwargs(slot_bits, parser, support_legacy=False)
+    if key_bits or slot_bits:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает только аргументы вида имя=значение')
+    return PrerenderedNode(template_name, keys, slots)
@@ -1,6 +1,76 @@
+import asyncio
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
 from http import HTTPStatus
 
-from django.test import Client, TestCase
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.template import Context, Template
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from posts.models import Post
+
+from . import asgi, prerender
+from .cache.sqlite import SQLiteCache
+from .db import routers
+from .db.backends.sqlite3.base import DatabaseWrapper, WriteQueue
+from .middleware import instrumentation
+from .middleware.replicas import ReplicaMiddleware
+from .models import Task
+from .tasks import Worker, task
+
+User = get_user_model()
+
+
+def asgi_request(path, query='', headers=(), body=b'', method='GET',
+                 disconnect_after=None):
+    """Запрос к yatube/asgi.py; возвращает статус, заголовки и части
+    тела. ``disconnect_after`` — через сколько секунд клиент уйдёт."""
+    from yatube.asgi import application
+
+    async def run():
+        messages = asyncio.Queue()
+        messages.put_nowait({'type': 'http.request', 'body': body})
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query.encode(),
+            'headers': [
+                (name.encode(), value.encode()) for name, value in headers],
+            'server': ('testserver', 80),
+        }
+        handler = asyncio.ensure_future(
+            application(scope, messages.get, send))
+        if disconnect_after is not None:
+            await asyncio.sleep(disconnect_after)
+            messages.put_nowait({'type': 'http.disconnect'})
+        await handler
+        return sent
+
+    start, *chunks = asyncio.run(run())
+    return (start['status'], dict(start['headers']),
+            [chunk.get('body', b'') for chunk in chunks])
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +81,507 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_get_set_delete(self):
+        self.cache.set('post', {'text': 'Тест'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Тест'})
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertFalse(self.cache.add('new', 2))
+        self.assertEqual(
+            self.cache.get_many(['post', 'new', 'missing']),
+            {'post': {'text': 'Тест'}, 'new': 1},
+        )
+        self.cache.delete('post')
+        self.assertIsNone(self.cache.get('post'))
+
+    def test_expired_values_are_missing(self):
+        self.cache.set('key', 'value', timeout=-1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+
+    def test_incr_is_shared_between_instances(self):
+        other = self.make_cache()
+        self.cache.set('counter', 1)
+        self.assertEqual(other.incr('counter', 5), 6)
+        self.assertEqual(self.cache.incr('counter'), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_ints_beyond_64_bits(self):
+        for value in (2 ** 63 - 1, 2 ** 63, -2 ** 64):
+            with self.subTest(value=value):
+                self.cache.set('big', value)
+                self.assertEqual(self.cache.get('big'), value)
+        self.cache.set('counter', 2 ** 63 - 1)
+        self.assertEqual(self.cache.incr('counter'), 2 ** 63)
+        self.assertEqual(self.cache.incr('counter', -1), 2 ** 63 - 1)
+
+    def test_lru_eviction(self):
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache._db.execute("UPDATE cache SET accessed = 0 WHERE key = 'a'")
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 'b')
+        self.assertEqual(cache.stats()['entries'], 3)
+
+    def test_size_limit(self):
+        cache = self.make_cache(MAX_SIZE=1000, CULL_FREQUENCY=2)
+        for i in range(10):
+            cache.set(f'key{i}', 'x' * 200)
+        self.assertLessEqual(cache.stats()['size'], 1000 + 300)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ SQL"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'cache;desc="\d+ hit \d+ miss"')
+
+    def test_report_percentiles(self):
+        for _ in range(3):
+            self.client.get('/')
+        report = instrumentation.registry.report()['posts:index']
+        self.assertEqual(report['requests'], 3)
+        self.assertLessEqual(report['p50_ms'], report['p99_ms'])
+        self.assertGreater(report['max_queries'], 0)
+        self.assertGreater(report['avg_template_ms'], 0)
+
+    def test_report_requires_staff(self):
+        url = reverse('instrumentation')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_login(admin)
+        self.client.get('/')
+        self.assertIn('posts:index', self.client.get(url).json())
+
+    @override_settings(VIEW_BUDGETS={'posts:index': {'queries': 0}})
+    def test_budget_exceeded(self):
+        with self.assertRaises(instrumentation.BudgetExceeded):
+            self.client.get('/')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.reads = []
+
+    def tearDown(self):
+        routers.end()
+
+    def test_router(self):
+        routers.begin()
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        routers.use_replicas()
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        self.assertFalse(routers.wrote())
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertTrue(routers.wrote())
+        # после записи запрос дочитывает с основной базы
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_service_writes_do_not_pin(self):
+        routers.begin()
+        routers.use_replicas()
+        self.router.db_for_write(Session)
+        self.router.db_for_write(Task)
+        self.assertFalse(routers.wrote())
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+
+    def view(self, request, write=False):
+        if write:
+            self.router.db_for_write(Session)
+            self.router.db_for_write(Post)
+        self.reads.append(self.router.db_for_read(Post))
+        return HttpResponse()
+
+    def request(self, path, method='get', write=False, **extra):
+        request = getattr(RequestFactory(), method)(path, **extra)
+        request.resolver_match = resolve(path)
+        middleware = ReplicaMiddleware(
+            lambda request: middleware.process_view(
+                request, None, (), {}) or self.view(request, write))
+        return middleware(request)
+
+    def test_middleware(self):
+        self.request('/')
+        self.request('/create/')
+        self.request('/', method='post')
+        self.assertEqual(self.reads, ['replica1', 'default', 'default'])
+
+    def test_pinned_after_write(self):
+        response = self.request('/create/', method='post', write=True)
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.request('/', HTTP_COOKIE=f'{cookie.key}={cookie.value}')
+        self.request('/', HTTP_COOKIE=f'{cookie.key}=0')
+        self.assertEqual(self.reads, ['default', 'default', 'replica1'])
+
+
+class ReplicaTransactionTests(TestCase):
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_reads_inside_transaction_use_primary(self):
+        routers.use_replicas()
+        try:
+            with transaction.atomic():
+                self.assertEqual(
+                    routers.ReplicaRouter().db_for_read(Post), 'default')
+        finally:
+            routers.end()
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        database = dict(
+            connections.databases['default'], NAME=self.path,
+            OPTIONS=dict(settings.SQLITE_OPTIONS, timeout=0))
+        self.wrapper = DatabaseWrapper(database, alias='tuned')
+        self.addCleanup(self.wrapper.close)
+
+    def test_pragmas(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def other_connection(self):
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        return other
+
+    def test_write_transactions_take_write_lock(self):
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        other = self.other_connection()
+        with self.assertRaisesMessage(
+                sqlite3.OperationalError, 'database is locked'):
+            other.execute('BEGIN IMMEDIATE')
+        self.assertTrue(self.wrapper.in_write_queue)
+        self.wrapper._commit()
+        self.assertFalse(self.wrapper.in_write_queue)
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+    def test_read_transactions_do_not_block_writers(self):
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertFalse(self.wrapper.in_write_queue)
+        other = self.other_connection()
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+        # запись в той же транзакции встаёт в очередь до её конца
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE note (text TEXT)')
+        self.assertTrue(self.wrapper.in_write_queue)
+        self.wrapper._rollback()
+        self.assertFalse(self.wrapper.in_write_queue)
+
+    def test_autocommit_writes_use_write_queue(self):
+        calls = []
+
+        class Queue(WriteQueue):
+            def acquire(self):
+                calls.append('acquire')
+                super().acquire()
+
+            def release(self):
+                calls.append('release')
+                super().release()
+
+        self.wrapper.ensure_connection()
+        self.wrapper.write_queue = Queue()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(calls, [])
+            cursor.execute('CREATE TABLE note (text TEXT)')
+            cursor.executemany(
+                'INSERT INTO note VALUES (%s)', [['a'], ['b']])
+        self.assertEqual(calls, ['acquire', 'release'] * 2)
+        self.assertFalse(self.wrapper.in_write_queue)
+
+    def test_write_queue_is_fifo_and_reentrant(self):
+        queue = WriteQueue()
+        order = []
+        queue.acquire()
+        queue.acquire()
+        threads = []
+        for number in range(3):
+            thread = threading.Thread(
+                target=lambda number=number: (
+                    queue.acquire(), order.append(number), queue.release()))
+            thread.start()
+            threads.append(thread)
+            # следующий поток встаёт в очередь после предыдущего
+            while queue._next != number + 2:
+                pass
+        queue.release()
+        self.assertEqual(order, [])
+        queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2])
+
+
+class PrerenderTests(TestCase):
+    def setUp(self):
+        prerender.clear()
+        self.addCleanup(prerender.clear)
+
+    def test_header_variants(self):
+        user = User.objects.create_user(username='<b>author</b>')
+        self.client.force_login(user)
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertContains(response, 'Пользователь: &lt;b&gt;author')
+        self.assertContains(response, 'Выйти')
+        self.assertEqual(
+            response.content.decode().count('nav-link active'), 1)
+        self.client.logout()
+        response = self.client.get(reverse('about:tech'))
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertEqual(len(prerender._fragments), 3)
+
+    def test_slots_are_filled_per_render(self):
+        template = Template(
+            '{% load prerender %}{% prerendered "includes/header.html" '
+            'authenticated=True view_name="" slots username=name %}')
+        for name in ('first', 'second'):
+            html = template.render(Context({'name': name}))
+            self.assertIn(f'Пользователь: {name}', html)
+
+    def test_built_variants(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'prerendered.json')
+        fragments = {'includes/footer.html': ([{'year': 1999}], ())}
+        self.assertEqual(prerender.build(fragments, path), 1)
+        with override_settings(PRERENDERED_FRAGMENTS=path):
+            prerender.load()
+            self.assertIn(
+                ('includes/footer.html', (('year', 1999),)),
+                prerender._fragments)
+            # файл, собранный из другой версии шаблона, не используется
+            with open(path) as file:
+                stale = file.read().replace('"digest": "', '"digest": "0')
+            with open(path, 'w') as file:
+                file.write(stale)
+            prerender.clear()
+            prerender.load()
+            self.assertEqual(prerender._fragments, {})
+
+
+class ASGITests(TestCase):
+    def test_sync_views(self):
+        status, headers, chunks = asgi_request(reverse('posts:index'))
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(
+            headers[b'Content-Type'], b'text/html; charset=utf-8')
+        self.assertIn('Последние обновления', b''.join(chunks).decode())
+        status, _, _ = asgi_request('/nonexist-page/')
+        self.assertEqual(status, HTTPStatus.NOT_FOUND)
+
+    def test_environ(self):
+        body = io.BytesIO(b'text=%D0%BF%D0%BE%D1%81%D1%82')
+        environ = asgi.make_environ({
+            'method': 'POST',
+            'path': '/пост/',
+            'query_string': b'a=1',
+            'headers': [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', b'29'),
+                (b'accept', b'text/html'),
+                (b'accept', b'*/*'),
+            ],
+        }, body)
+        request = WSGIRequest(environ)
+        self.assertEqual(request.path, '/пост/')
+        self.assertEqual(request.GET['a'], '1')
+        self.assertEqual(request.POST['text'], 'пост')
+        self.assertEqual(request.META['HTTP_ACCEPT'], 'text/html,*/*')
+
+    def test_lifespan(self):
+        from yatube.asgi import application
+
+        async def run():
+            messages = asyncio.Queue()
+            for kind in ('startup', 'shutdown'):
+                messages.put_nowait({'type': f'lifespan.{kind}'})
+            sent = []
+
+            async def send(message):
+                sent.append(message['type'])
+
+            await application({'type': 'lifespan'}, messages.get, send)
+            return sent
+
+        self.assertEqual(asyncio.run(run()), [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(batch_size=10)
+def record_batch(items):
+    calls.append(sorted(item['value'] for item in items))
+
+
+@task(max_attempts=2)
+def fail():
+    raise ValueError('не получилось')
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker('test')
+
+    def run_all(self):
+        while self.worker.run_once()[1]:
+            pass
+
+    def test_priority_and_batches(self):
+        record_batch.delay(value=2)
+        record.delay(value='low')
+        record_batch.delay(value=1)
+        record.delay(value='high', priority=10)
+        self.run_all()
+        self.assertEqual(calls, ['high', [1, 2], 'low'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_transaction_deduplicates_and_rollback_drops(self):
+        with transaction.atomic():
+            for _ in range(3):
+                record.delay(value=1)
+            record.delay(value=2)
+            self.assertFalse(Task.objects.exists())
+        self.assertEqual(Task.objects.count(), 2)
+        Task.objects.all().delete()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                record.delay(value=3)
+                raise ValueError
+        with transaction.atomic():
+            record.delay(value=4)
+        self.assertEqual(
+            list(Task.objects.values_list('payload', flat=True)),
+            ['{"value": 4}'])
+
+    def test_savepoint_rollback_drops_its_tasks(self):
+        with transaction.atomic():
+            record.delay(value=1)
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    record.delay(value=1, priority=10)
+                    record.delay(value=2)
+                    raise ValueError
+            with transaction.atomic():
+                record.delay(value=3)
+            transaction.on_commit(lambda: record.delay(value=4))
+        self.assertEqual(
+            sorted(Task.objects.values_list('payload', 'priority')),
+            [('{"value": 1}', 0), ('{"value": 3}', 0), ('{"value": 4}', 0)])
+
+    def test_retry_with_backoff_then_fail(self):
+        fail.delay()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(self.worker.run_once()[1:], (1, False))
+        retried = Task.objects.get()
+        self.assertEqual(retried.attempts, 1)
+        self.assertIsNone(retried.locked_by)
+        self.assertGreater(
+            retried.run_at,
+            timezone.now() + timedelta(seconds=settings.TASK_RETRY_DELAY - 5))
+        self.assertEqual(self.worker.run_once(), (None, 0, True))
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.worker.run_once()
+        failed = Task.objects.get()
+        self.assertIsNotNone(failed.failed_at)
+        self.assertIn('не получилось', failed.last_error)
+        self.assertEqual(self.worker.run_once(), (None, 0, True))
+
+    def test_lease(self):
+        record.delay(value=1)
+        function, tasks = self.worker.claim()
+        self.assertEqual(len(tasks), 1)
+        other = Worker('other')
+        self.assertEqual(other.claim(), (None, []))
+        # воркер упал, аренда истекла
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(len(other.claim()[1]), 1)
+
+    def test_unknown_task_fails(self):
+        Task.objects.create(name='core.tests.missing')
+        record.delay(value=1)
+        self.run_all()
+        self.assertEqual(calls, [1])
+        self.assertEqual(
+            Task.objects.get().last_error, 'Нет задачи core.tests.missing')
+
+    def test_many_unknown_tasks_fail_without_recursion(self):
+        Task.objects.bulk_create(
+            Task(name='core.tests.missing', priority=1) for _ in range(1100))
+        record.delay(value=1)
+        self.run_all()
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.filter(failed_at__isnull=False).count(),
+                         1100)
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        TASK_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_queued_email(self):
+        message = mail.EmailMultiAlternatives(
+            'Сброс пароля', 'Текст', 'site@yatube.ru', ['user@yatube.ru'])
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.attach('note.txt', 'вложение', 'text/plain')
+        message.send()
+        mail.send_mail('Второе', 'Текст', None, ['other@yatube.ru'])
+        self.assertEqual(mail.outbox, [])
+        out = io.StringIO()
+        call_command('run_worker', burst=True, stdout=out)
+        self.assertIn('Выполнено задач: 2', out.getvalue())
+        sent, second = mail.outbox
+        self.assertEqual(sent.subject, 'Сброс пароля')
+        self.assertEqual(sent.to, ['user@yatube.ru'])
+        self.assertEqual(sent.alternatives, [('<p>Текст</p>', 'text/html')])
+        self.assertEqual(
+            sent.attachments, [('note.txt', 'вложение', 'text/plain')])
+        self.assertEqual(second.from_email, settings.DEFAULT_FROM_EMAIL)
@@ -1,6 +1,10 @@
 # core/views.py
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core.middleware import instrumentation
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -18,3 +22,9 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def instrumentation_report(request):
+    """Перцентили времени и число запросов по URL в этом процессе."""
+    return JsonResponse(instrumentation.registry.report())
@@ -0,0 +1,40 @@
+"""Асинхронные варианты view «N новых записей» для ASGI.
+
+Подключаются по именам URL в ``ASGI_VIEWS`` (core/asgi.py) и отвечают
+на те же адреса, что и posts.views.*_live под WSGI. Middleware для них
+не вызываются, поэтому всё, что читает базу, идёт через run_sync().
+"""
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import get_object_or_404
+
+from core.asgi import authenticate, run_sync
+
+from .live import async_live_response
+from .models import Follow, Group, Post
+from .timeline import timeline_posts
+
+
+def followed_authors(user):
+    return list(Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True))
+
+
+async def index_live(request):
+    return await async_live_response(request, ['index'], Post.objects.all())
+
+
+async def group_live(request, slug):
+    group = await run_sync(
+        get_object_or_404, Group.objects.only('pk'), slug=slug)
+    return await async_live_response(
+        request, [f'group:{group.pk}'], Post.objects.filter(group=group))
+
+
+async def follow_live(request):
+    user = await run_sync(authenticate, request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    authors = await run_sync(followed_authors, user)
+    posts = await run_sync(timeline_posts, user)
+    return await async_live_response(
+        request, [f'author:{author}' for author in authors], posts)
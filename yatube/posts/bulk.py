@@ -0,0 +1,79 @@
+"""Помощники для массовой записи в обход сигналов (seed, import_posts)."""
+import itertools
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def chunks(iterable, size):
+    """Нарезает поток на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def safe_batch_size(model, batch_size, objects):
+    """Django 2.2 не ограничивает явный batch_size лимитами СУБД, а SQLite
+    не принимает больше 500 строк в одном INSERT ... SELECT UNION ALL."""
+    limit = connection.ops.bulk_batch_size(
+        [field for field in model._meta.concrete_fields
+         if not field.primary_key], objects)
+    return max(min(batch_size or limit, limit), 1)
+
+
+def bulk_insert(model, objects, batch_size=None):
+    model.objects.bulk_create(
+        objects,
+        batch_size=safe_batch_size(model, batch_size, objects),
+        ignore_conflicts=True,
+    )
+
+
+def insert_returning_ids(model, objects, batch_size=None):
+    """Записывает объекты и проставляет им id. Где INSERT возвращает
+    id (PostgreSQL), их проставляет bulk_create. На SQLite id строк
+    одного INSERT идут подряд и заканчиваются last_insert_rowid()
+    соединения, поэтому чужие записи в них не попадут."""
+    batch_size = safe_batch_size(model, batch_size, objects)
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objects, batch_size=batch_size)
+        return [obj.pk for obj in objects]
+    for batch in chunks(objects, batch_size):
+        model.objects.bulk_create(batch, batch_size=len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT last_insert_rowid()')
+            last, = cursor.fetchone()
+        for pk, obj in enumerate(batch, last - len(batch) + 1):
+            obj.pk = pk
+    return [obj.pk for obj in objects]
+
+
+def last_id(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+@contextmanager
+def manual_field(model, name):
+    """Отключает auto_now_add, чтобы задать даты самим."""
+    field = model._meta.get_field(name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+# Колонки выгрузки постов (export_posts, import_posts)
+POST_FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+FORMATS = ('jsonl', 'csv')
+
+
+def detect_format(path, format_=None):
+    """Формат из опции --format или из расширения файла."""
+    if format_:
+        return format_
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
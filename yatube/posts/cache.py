@@ -0,0 +1,76 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post
+
+# Время последнего изменения постов, комментариев или подписок;
+# входит в валидаторы условных ответов (posts/conditional.py)
+CHANGED_AT_KEY = 'posts:changed_at'
+# Общее число постов для паджинатора главной; меняется сигналами
+POSTS_COUNT_KEY = 'posts:count'
+# Число постов, опубликованных всеми процессами (posts/live.py)
+PUBLISHED_KEY = 'posts:published'
+
+
+def invalidate_post(post_id):
+    """Меняет версию карточки поста на главной. Старый фрагмент не
+    удаляется, а перестаёт совпадать с ключом
+    {% cache ... post.pk post.card_version ... %}: отрисовка, начатая до
+    фиксации изменения, закеширует его под старой версией."""
+    Post.objects.filter(pk=post_id).update(
+        card_version=F('card_version') + 1)
+    touch()
+
+
+def touch():
+    cache.set(CHANGED_AT_KEY, time.time(), None)
+
+
+def changed_at():
+    """Отметка последнего изменения. Если ключ вытеснен из кеша,
+    отметка ставится заново, и клиенты один раз получат полный ответ."""
+    value = cache.get(CHANGED_AT_KEY)
+    if value is None:
+        cache.add(CHANGED_AT_KEY, time.time(), None)
+        value = cache.get(CHANGED_AT_KEY, time.time())
+    return value
+
+
+def published_count():
+    return cache.get(PUBLISHED_KEY, 0)
+
+
+def bump_published():
+    try:
+        cache.incr(PUBLISHED_KEY)
+    except ValueError:
+        cache.add(PUBLISHED_KEY, 1, None)
+
+
+def posts_count():
+    """Число всех постов. При промахе считается один раз COUNT(*),
+    дальше поддерживается bump_posts_count()."""
+    value = cache.get(POSTS_COUNT_KEY)
+    if value is None:
+        value = Post.objects.count()
+        cache.add(POSTS_COUNT_KEY, value, None)
+    return value
+
+
+def bump_posts_count(delta):
+    """Меняет число постов после фиксации транзакции, чтобы откат
+    не оставил счётчик завышенным."""
+    def bump():
+        try:
+            cache.incr(POSTS_COUNT_KEY, delta)
+        except ValueError:
+            # ключа нет: его пересчитает следующий posts_count()
+            pass
+    transaction.on_commit(bump)
+
+
+def reset_posts_count():
+    cache.delete(POSTS_COUNT_KEY)
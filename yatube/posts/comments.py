@@ -0,0 +1,103 @@
+"""Ветки комментариев под постом.
+
+Страница — ``COMMENTS_PER_PAGE`` корневых комментариев (keyset по
+path), а ответы на них до ``COMMENT_THREAD_DEPTH`` уровней читаются
+одним диапазоном path по индексу (post, path). Более глубокие ответы
+свёрнуты: у последнего показанного уровня выводится число ответов в
+ветке и ссылка на её продолжение, ``?thread=<id>``.
+"""
+from django.conf import settings
+from django.http import Http404
+
+from .models import PATH_STEP
+from .utils import CursorPaginator, InvalidCursor
+
+# Порядок корневых комментариев по ?order=, первый — по умолчанию.
+# Ответы внутри ветки всегда идут от старых к новым
+COMMENT_ORDERINGS = {
+    'oldest': ('path',),
+    'newest': ('-path',),
+}
+
+
+def int_param(request, name):
+    try:
+        return max(int(request.GET.get(name, '')), 0)
+    except ValueError:
+        return None
+
+
+def mark(comments, base, last_depth):
+    """Отступ от base и число свёрнутых ответов у последнего уровня."""
+    for comment in comments:
+        comment.indent = comment.depth - base
+        comment.collapsed = 0
+        if comment.depth == last_depth:
+            comment.collapsed = comment.descendants_count
+    return comments
+
+
+def roots_context(post, request, order):
+    paginator = CursorPaginator(
+        post.comments.filter(depth=0).only('post', 'path'),
+        settings.COMMENTS_PER_PAGE, COMMENT_ORDERINGS[order])
+    cursor = request.GET.get('cursor')
+    try:
+        page = (paginator.cursor_page(cursor) if cursor
+                else paginator.first_page())
+    except InvalidCursor:
+        raise Http404('Некорректный курсор комментариев')
+    paths = [root.path for root in page.object_list]
+    comments = []
+    if paths:
+        last_depth = settings.COMMENT_THREAD_DEPTH
+        comments = list(post.comments.branches(
+            min(paths), max(paths), last_depth).select_related('author'))
+        if order != 'oldest':
+            # ветки в порядке корней, ответы внутри — по path
+            position = {path: index for index, path in enumerate(paths)}
+            comments.sort(key=lambda node: position[node.path[:PATH_STEP]])
+        mark(comments, 0, last_depth)
+    return {
+        'comments': comments,
+        'comments_page': page,
+        'comments_base': 0,
+    }
+
+
+def thread_context(post, request, thread_id, fragment):
+    root = post.comments.filter(pk=thread_id).only(
+        'post', 'path', 'depth').first()
+    if root is None:
+        raise Http404('Комментарий не найден')
+    last_depth = root.depth + settings.COMMENT_THREAD_DEPTH
+    comments = list(post.comments.branches(
+        root.path, root.path, last_depth).select_related('author'))
+    base = root.depth
+    if fragment:
+        # фрагмент встаёт под уже показанным комментарием
+        # с отступами страницы, откуда его подгрузили
+        comments = comments[1:]
+        base = min(int_param(request, 'base') or 0, root.depth)
+    return {
+        'comments': mark(comments, base, last_depth),
+        'comments_page': None,
+        'comments_base': base,
+        'comments_thread': root,
+    }
+
+
+def get_comments(post, request, fragment=False):
+    """Контекст комментариев поста: ветка комментария ``?thread=<id>``
+    или страница корневых комментариев по ``?order=`` и ``?cursor=``.
+    Во фрагменте ветка выдаётся без самого комментария."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = next(iter(COMMENT_ORDERINGS))
+    thread_id = int_param(request, 'thread')
+    if thread_id is not None:
+        context = thread_context(post, request, thread_id, fragment)
+    else:
+        context = roots_context(post, request, order)
+    context['comments_order'] = order
+    return context
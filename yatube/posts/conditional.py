@@ -0,0 +1,89 @@
+"""Условные ответы для лент и страницы поста.
+
+До выборки постов и рендеринга view считает дешёвый валидатор:
+одну выборку по индексу (дата и id последнего поста, число
+комментариев) и отметку последнего изменения из кеша, которую
+сигналы обновляют при правке, удалении, комментариях и подписках.
+Если клиент прислал совпадающий ETag или If-Modified-Since,
+отдаётся 304 без основных запросов и шаблона.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
+from django.utils.http import http_date
+
+from .cache import changed_at
+from .models import Post
+
+
+def conditional(validator, public=False):
+    """``validator(request, *args, **kwargs)`` возвращает кортеж
+    значений для ETag и время последнего изменения (datetime или None).
+
+    Страницы с public=True одинаковы для всех пользователей: ETag не
+    зависит от пользователя, а ответ можно хранить в общих кешах.
+    ETag доступен view как ``request.etag``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            values, modified = validator(request, *args, **kwargs)
+            stamp = changed_at()
+            if modified is not None:
+                stamp = max(stamp, modified.timestamp())
+            user_id = None if public else request.user.pk
+            etag = quote_etag(hashlib.md5(repr((
+                request.get_full_path(), user_id, stamp, values,
+            )).encode()).hexdigest())
+            request.etag = etag
+            last_modified = int(stamp)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            # страницы должны перепроверяться, а пользовательские
+            # не должны попадать в общие кеши
+            scope = 'public' if public else 'private'
+            patch_cache_control(response, no_cache=True, **{scope: True})
+            return response
+        return wrapper
+    return decorator
+
+
+def latest(posts):
+    # Последний пост берётся по индексу ленты. Два MAX() в одном
+    # запросе SQLite не оптимизирует и читает весь индекс.
+    row = posts.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id').first()
+    if row is None:
+        return (None,), None
+    return (row[1],), row[0]
+
+
+def index_validator(request, kind=None):
+    return latest(Post.objects.all())
+
+
+def group_validator(request, slug, kind=None):
+    return latest(Post.objects.filter(group__slug=slug))
+
+
+def profile_validator(request, username, kind=None):
+    return latest(Post.objects.filter(author__username=username))
+
+
+def post_validator(request, post_id):
+    data = Post.objects.filter(pk=post_id).order_by().values(
+        'comments_count').annotate(
+            latest=Max('comments__created')).first()
+    if data is None:
+        return (None,), None
+    return (data['comments_count'],), data['latest']
@@ -0,0 +1,161 @@
+"""Ленты Atom и RSS для главной, групп и авторов.
+
+Документ отдаётся потоком: сначала заголовок ленты, затем записи по
+одной, по мере чтения постов из базы. Готовое тело кладётся в кеш под
+ETag ответа (posts/conditional.py), который меняется с каждым новым
+постом, поэтому повторные запросы отдаются из кеша без рендеринга,
+а клиенты с совпадающим ETag получают 304.
+"""
+import hashlib
+from functools import wraps
+from io import StringIO
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import feedgenerator
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+ENCODING = 'utf-8'
+
+
+class StreamingFeedMixin:
+    """Пишет ленту частями: заголовок, каждую запись и окончание."""
+
+    def latest_post_date(self):
+        # записи ещё не прочитаны, когда пишется заголовок ленты
+        return self.feed.get('updated') or super().latest_post_date()
+
+    def stream(self, items):
+        buffer = StringIO()
+        handler = SimplerXMLGenerator(buffer, ENCODING)
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk.encode(ENCODING)
+
+        self.start(handler)
+        yield flush()
+        for item in items:
+            self.items = []
+            self.add_item(**item)
+            self.write_items(handler)
+            yield flush()
+        self.end(handler)
+        yield flush()
+
+
+class AtomFeed(StreamingFeedMixin, feedgenerator.Atom1Feed):
+    def start(self, handler):
+        handler.startDocument()
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        handler.endElement('feed')
+
+
+class RssFeed(StreamingFeedMixin, feedgenerator.Rss201rev2Feed):
+    def start(self, handler):
+        handler.startDocument()
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+FORMATS = {'atom': AtomFeed, 'rss': RssFeed}
+
+
+class FormatConverter:
+    """Конвертер пути <feed:kind>: atom или rss."""
+    regex = '|'.join(FORMATS)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def item(request, post):
+    link = request.build_absolute_uri(
+        reverse('posts:post_detail', args=[post.pk]))
+    author = post.author
+    return {
+        'title': Truncator(post.text).chars(50),
+        'link': link,
+        'unique_id': link,
+        'description': linebreaks(post.text, autoescape=True),
+        'author_name': author.get_full_name() or author.username,
+        'author_link': request.build_absolute_uri(
+            reverse('posts:profile', args=[author.username])),
+        'pubdate': post.pub_date,
+        'categories': [post.group.title] if post.group else (),
+    }
+
+
+def cache_key(request, kind):
+    """Ключ тела ленты. ETag не зависит от адреса сайта, а ссылки в
+    ленте абсолютные, поэтому в ключ входят схема и хост."""
+    etag = getattr(request, 'etag', None)
+    if not etag:
+        return None
+    origin = hashlib.md5(
+        f'{request.scheme}://{request.get_host()}'.encode()).hexdigest()
+    return f'feed:{kind}:{origin}:{etag}'
+
+
+def cached(view):
+    """Отдаёт тело ленты из кеша до запросов самого view.
+    Ставится под декоратором conditional, который задаёт ETag."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = cache_key(request, kwargs['kind'])
+        body = key and cache.get(key)
+        if body:
+            return HttpResponse(
+                body, content_type=FORMATS[kwargs['kind']].content_type)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def caching(key, chunks):
+    """Отдаёт части тела и после последней кладёт всё тело в кеш."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), settings.FEED_CACHE_TIMEOUT)
+
+
+def feed_response(request, kind, posts, title, link, description):
+    """Потоковый ответ с лентой последних settings.FEED_ITEMS постов."""
+    feed_class = FORMATS[kind]
+    rows = iter(posts[:settings.FEED_ITEMS].iterator())
+    first = next(rows, None)
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description,
+        feed_url=request.build_absolute_uri(),
+        language=settings.LANGUAGE_CODE,
+        updated=first and first.pub_date,
+    )
+    posts = (
+        item(request, post) for post in chain([first] if first else (), rows))
+    chunks = feed.stream(posts)
+    key = cache_key(request, kind)
+    if key:
+        chunks = caching(key, chunks)
+    return StreamingHttpResponse(
+        chunks, content_type=feed_class.content_type)
@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from .images import normalize_image
 from .models import Post, Comment
 
 
@@ -12,6 +14,17 @@ class PostForm(forms.ModelForm):
             'image': "Картика"
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, width, height = normalize_image(image)
+            self.instance.image_width = width
+            self.instance.image_height = height
+        elif not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
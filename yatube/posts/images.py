@@ -0,0 +1,64 @@
+"""Обработка картинок постов при загрузке.
+
+Картинка уменьшается до IMAGE_UPLOAD_MAX_SIZE, поворачивается по EXIF
+и перекодируется в IMAGE_UPLOAD_FORMAT без метаданных. Если Pillow
+собран без нужного кодека, используется IMAGE_UPLOAD_FALLBACK_FORMAT.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {
+    'AVIF': '.avif',
+    'WEBP': '.webp',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+}
+CODECS = {
+    'AVIF': 'avif',
+    'WEBP': 'webp',
+}
+
+
+def output_format(image):
+    for name in (settings.IMAGE_UPLOAD_FORMAT,
+                 settings.IMAGE_UPLOAD_FALLBACK_FORMAT):
+        codec = CODECS.get(name)
+        if codec is None or features.check(codec):
+            break
+    if name == 'JPEG' and image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG не хранит прозрачность
+        return 'PNG'
+    return name
+
+
+def normalize_image(uploaded):
+    """Возвращает (файл, ширина, высота) для загруженной картинки."""
+    image = Image.open(uploaded)
+    if getattr(image, 'is_animated', False):
+        # анимацию не перекодируем, чтобы не потерять кадры
+        uploaded.seek(0)
+        return uploaded, image.width, image.height
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(settings.IMAGE_UPLOAD_MAX_SIZE, Image.LANCZOS)
+    name = output_format(image)
+    if name == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    # PNG берёт exif и icc_profile из image.info, если их не передать:
+    # метаданные убираем явно
+    image.info = {}
+    image.save(buffer, name, quality=settings.IMAGE_UPLOAD_QUALITY,
+               optimize=True)
+    filename = os.path.splitext(os.path.basename(uploaded.name))[0]
+    normalized = SimpleUploadedFile(
+        filename + EXTENSIONS[name],
+        buffer.getvalue(),
+        content_type=Image.MIME[name],
+    )
+    return normalized, image.width, image.height
@@ -0,0 +1,365 @@
+"""Уведомления «N новых записей» для открытых лент.
+
+Лента подписывается на каналы брокера: ``index``, ``group:<id>`` или
+``author:<id>`` каждого автора из подписок. Сигнал сохранения поста
+после фиксации транзакции публикует его id в каналы ленты, и ждущие
+потоки просыпаются сразу, без запросов к базе и кешу.
+
+Брокер живёт в памяти процесса. Посты других воркеров замечает один
+поток-наблюдатель на процесс: раз в ``LIVE_HEARTBEAT`` секунд он
+сравнивает общий счётчик опубликованных постов в кеше со своими
+публикациями и, если появились чужие, просит подписки пересчитать
+новые посты по базе. Сами соединения кеш не читают, иначе каждый
+поток держал бы своё соединение с ним.
+
+Клиент с ``Accept: text/event-stream`` получает поток Server-Sent
+Events, остальные — long-poll: JSON, как только новых постов станет
+больше, чем клиент уже знает, или через ``LIVE_POLL_TIMEOUT`` секунд.
+
+Под WSGI соединение занимает поток (live_response), под ASGI ждёт в
+цикле событий (async_live_response, posts/async_views.py), а запросы к
+базе уходят в пул core.asgi.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+
+from core.asgi import AsyncStreamingHttpResponse, run_sync
+
+from .cache import bump_published, published_count
+
+
+class Subscription:
+    def __init__(self, channels, waker=None):
+        self.channels = tuple(channels)
+        self.posts = []
+        self.rechecks = 0
+        self.condition = threading.Condition()
+        # вызывается из потока публикации, будит асинхронного читателя
+        self.waker = waker
+
+    def notify(self, post_id):
+        with self.condition:
+            self.posts.append(post_id)
+            self.condition.notify_all()
+        self.wake()
+
+    def recheck(self):
+        with self.condition:
+            self.rechecks += 1
+            self.condition.notify_all()
+        self.wake()
+
+    def wake(self):
+        if self.waker is None:
+            return
+        try:
+            self.waker()
+        except RuntimeError:
+            # цикл событий уже закрыт, подписка вот-вот отпишется
+            pass
+
+    def state(self):
+        with self.condition:
+            return len(self.posts), self.rechecks
+
+    def wait(self, seen, timeout):
+        """Ждёт публикаций или пересчёта сверх состояния ``seen`` не
+        дольше timeout секунд. Возвращает новое состояние и id постов,
+        опубликованных после ``seen``."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (len(self.posts), self.rechecks) != seen, timeout)
+            return (len(self.posts), self.rechecks), self.posts[seen[0]:]
+
+    async def wait_async(self, wakeup, seen, timeout):
+        """wait() для цикла событий; ``wakeup`` — asyncio.Event,
+        который выставляет waker подписки."""
+        wakeup.clear()
+        if self.state() == seen:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.wait(seen, 0)
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+        self.published = 0
+        self.watcher = None
+
+    def subscribe(self, channels, waker=None):
+        subscription = Subscription(channels, waker)
+        with self.lock:
+            for channel in subscription.channels:
+                self.channels[channel].add(subscription)
+            if self.watcher is None:
+                self.watcher = threading.Thread(
+                    target=self.watch, name='live-watcher', daemon=True)
+                self.watcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.channels[channel]
+
+    def subscriptions(self, channels=None):
+        with self.lock:
+            if channels is None:
+                channels = list(self.channels)
+            return set().union(*(
+                self.channels.get(channel, ()) for channel in channels))
+
+    def publish(self, channels, post_id):
+        with self.lock:
+            self.published += 1
+        subscriptions = self.subscriptions(channels)
+        for subscription in subscriptions:
+            subscription.notify(post_id)
+        return len(subscriptions)
+
+    def recheck(self):
+        subscriptions = self.subscriptions()
+        for subscription in subscriptions:
+            subscription.recheck()
+        return len(subscriptions)
+
+    def count(self):
+        return len(self.subscriptions())
+
+    def check(self, total, local):
+        """Сверяет общий счётчик публикаций со своими. Возвращает
+        новую пару счётчиков и были ли посты других процессов."""
+        new_total, new_local = published_count(), self.published
+        # ключ вытеснен из кеша: неизвестно, были ли чужие посты
+        foreign = (new_total < total
+                   or new_total - total > new_local - local)
+        return (new_total, new_local), foreign
+
+    def watch(self):
+        counters = published_count(), self.published
+        while True:
+            time.sleep(settings.LIVE_HEARTBEAT)
+            counters, foreign = self.check(*counters)
+            if foreign:
+                self.recheck()
+
+
+broker = Broker()
+
+
+def post_channels(post):
+    channels = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        channels.append(f'group:{post.group_id}')
+    return channels
+
+
+def publish_post(post):
+    bump_published()
+    return broker.publish(post_channels(post), post.pk)
+
+
+def new_ids(posts, after):
+    """id новых постов ленты, не больше LIVE_MAX_COUNT. По id, а не
+    числом: пост, посчитанный при подключении и пришедший потом
+    событием, не считается дважды."""
+    return set(posts.filter(pk__gt=after).order_by('pk').values_list(
+        'pk', flat=True)[:settings.LIVE_MAX_COUNT])
+
+
+def latest_id(posts):
+    return posts.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def release_connection():
+    """Соединение с базой не держится открытым всё время потока;
+    внутри транзакции (в тестах) его закрывать нельзя."""
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def payload(known, after):
+    # больше LIVE_MAX_COUNT не считаем, показываем «99+»
+    return {
+        'new': min(len(known), settings.LIVE_MAX_COUNT),
+        'more': len(known) >= settings.LIVE_MAX_COUNT,
+        'after': after,
+    }
+
+
+def event(known, after):
+    return f'event: posts\ndata: {json.dumps(payload(known, after))}\n\n'
+
+
+def stream(subscription, posts, after, known, seen):
+    """Тело потока: событие с числом новых постов при подключении и при
+    каждом изменении, комментарий-heartbeat в паузах. Поток
+    закрывается через LIVE_MAX_SECONDS, браузер переподключается."""
+    try:
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+        yield event(known, after)
+        release_connection()
+        deadline = time.monotonic() + settings.LIVE_MAX_SECONDS
+        while True:
+            timeout = min(
+                settings.LIVE_HEARTBEAT, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            state, published = subscription.wait(seen, timeout)
+            if state == seen:
+                yield ': heartbeat\n\n'
+                continue
+            count = len(known)
+            if state[1] != seen[1]:
+                known = new_ids(posts, after)
+                release_connection()
+            known.update(pk for pk in published if pk > after)
+            seen = state
+            if len(known) != count:
+                yield event(known, after)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def query_int(request, name, default=None):
+    try:
+        return max(int(request.GET[name]), 0)
+    except (KeyError, ValueError):
+        return default
+
+
+def wants_stream(request):
+    return 'text/event-stream' in request.META.get('HTTP_ACCEPT', '')
+
+
+def stream_headers(response):
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ClosingStreamingHttpResponse(StreamingHttpResponse):
+    """StreamingHttpResponse, который вызывает ``on_close``, когда
+    сервер закрывает ответ. Если клиент ушёл до первого чтения тела,
+    finally генератора не выполнится, а close() сервер вызовет
+    всегда."""
+
+    def __init__(self, *args, on_close, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    def close(self):
+        try:
+            self.on_close()
+        finally:
+            super().close()
+
+
+def live_response(request, channels, posts):
+    """SSE или long-poll для ленты ``posts`` с каналами ``channels``.
+    ``?after=<id>`` — последний пост, который видит читатель; long-poll
+    отвечает, когда новых постов станет больше ``?known=``."""
+    after = query_int(request, 'after')
+    # подписка до подсчёта: пост, сохранённый между ними, не потеряется
+    subscription = broker.subscribe(channels)
+    try:
+        seen = subscription.state()
+        if after is None:
+            after = latest_id(posts)
+        known = new_ids(posts, after)
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+    if wants_stream(request):
+        return stream_headers(ClosingStreamingHttpResponse(
+            stream(subscription, posts, after, known, seen),
+            content_type='text/event-stream',
+            on_close=partial(broker.unsubscribe, subscription)))
+    try:
+        if len(known) <= query_int(request, 'known', 0):
+            release_connection()
+            state, published = subscription.wait(
+                seen, settings.LIVE_POLL_TIMEOUT)
+            if state[1] != seen[1]:
+                known = new_ids(posts, after)
+            known.update(pk for pk in published if pk > after)
+    finally:
+        broker.unsubscribe(subscription)
+    return JsonResponse(payload(known, after))
+
+
+async def async_stream(subscription, wakeup, posts, after, known, seen):
+    """stream() для цикла событий: ожидание без потока, пересчёт в
+    пуле core.asgi."""
+    loop = asyncio.get_running_loop()
+    try:
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+        yield event(known, after)
+        deadline = loop.time() + settings.LIVE_MAX_SECONDS
+        while True:
+            timeout = min(settings.LIVE_HEARTBEAT, deadline - loop.time())
+            if timeout <= 0:
+                return
+            state, published = await subscription.wait_async(
+                wakeup, seen, timeout)
+            if state == seen:
+                yield ': heartbeat\n\n'
+                continue
+            count = len(known)
+            if state[1] != seen[1]:
+                known = await run_sync(new_ids, posts, after)
+            known.update(pk for pk in published if pk > after)
+            seen = state
+            if len(known) != count:
+                yield event(known, after)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def async_live_response(request, channels, posts):
+    """live_response() для асинхронных view под ASGI."""
+    after = query_int(request, 'after')
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    subscription = broker.subscribe(
+        channels, partial(loop.call_soon_threadsafe, wakeup.set))
+    try:
+        seen = subscription.state()
+        if after is None:
+            after = await run_sync(latest_id, posts)
+        known = await run_sync(new_ids, posts, after)
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+    if wants_stream(request):
+        return stream_headers(AsyncStreamingHttpResponse(
+            async_stream(subscription, wakeup, posts, after, known, seen),
+            content_type='text/event-stream',
+            on_close=partial(broker.unsubscribe, subscription)))
+    try:
+        if len(known) <= query_int(request, 'known', 0):
+            state, published = await subscription.wait_async(
+                wakeup, seen, settings.LIVE_POLL_TIMEOUT)
+            if state[1] != seen[1]:
+                known = await run_sync(new_ids, posts, after)
+            known.update(pk for pk in published if pk > after)
+    finally:
+        broker.unsubscribe(subscription)
+    return JsonResponse(payload(known, after))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Заново раскладывает посты по лентам подписок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        created = timeline.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Записей в лентах: {created}'))
@@ -0,0 +1,243 @@
+"""Замер страниц из posts/urls.py на засеянной базе (manage.py seed).
+
+Запросы идут через тестовый клиент внутри процесса, так что в замер
+попадают middleware, view, ORM и шаблоны, но не сеть и не WSGI-сервер.
+Объекты для URL выбираются генератором с фиксированным seed, а все
+изменения (подписки, отписки) откатываются в конце. Результаты можно
+сохранить в JSON и сравнить с прошлым прогоном через --compare.
+
+Ожидающие URL живых лент (posts/live.py) замеряются только по --url и
+с нулевым LIVE_POLL_TIMEOUT: иначе каждый запрос long-poll длится весь
+таймаут, и замер показывает только его.
+"""
+import json
+import platform
+import random
+import re
+import subprocess
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.middleware.instrumentation import percentile
+from posts import urls
+from posts.feeds import FORMATS
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+QUERIES = re.compile(r'desc="(\d+) SQL"')
+POOL_SIZE = 50
+LIVE_URLS = {'index_live', 'group_live', 'follow_live'}
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def change(new, old):
+    if not old:
+        return None
+    return (new - old) / old
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность и задержки p50/p99 '
+            'для каждого URL из posts/urls.py')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--url', action='append', dest='names', default=None,
+            help='Имя URL без пространства имён; можно повторять',
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON')
+        parser.add_argument('--compare', help='JSON прошлого прогона')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимое ухудшение p50/p99, доля',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой при ухудшении выше порога',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        pools = self.pools()
+        patterns = [
+            pattern for pattern in urls.urlpatterns
+            if pattern.name in options['names']
+        ] if options['names'] else [
+            pattern for pattern in urls.urlpatterns
+            if pattern.name not in LIVE_URLS
+        ]
+        results = {}
+        # замер, а не проверка: бюджеты и DEBUG-журнал запросов выключены
+        with override_settings(
+                DEBUG=False, INSTRUMENTATION_ENFORCE_BUDGETS=False,
+                LIVE_POLL_TIMEOUT=0):
+            with transaction.atomic():
+                client = Client()
+                client.force_login(pools['reader'])
+                for pattern in patterns:
+                    results[pattern.name] = self.measure(
+                        client, pattern, pools,
+                        options['requests'], options['warmup'])
+                transaction.set_rollback(True)
+        report = {
+            'meta': self.meta(options),
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                results, baseline['results'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(
+                    'Ухудшение выше порога: ' + ', '.join(regressions))
+
+    def pools(self):
+        """Случайные, но воспроизводимые объекты для подстановки в URL."""
+        posts = list(Post.objects.values_list('pk', flat=True)[:10000])
+        if not posts:
+            raise CommandError('База пуста, сначала выполните manage.py seed')
+        reader = User.objects.order_by(
+            '-stats__following_count', 'pk').first()
+        authors = list(Post.objects.values_list(
+            'author__username', flat=True).distinct()[:1000])
+        groups = list(Group.objects.values_list('slug', flat=True)[:1000])
+        own_posts = list(reader.posts.values_list('pk', flat=True)[:100])
+        sample = self.random.sample
+        return {
+            'reader': reader,
+            'post_id': sample(posts, min(POOL_SIZE, len(posts))),
+            'username': sample(authors, min(POOL_SIZE, len(authors))),
+            'slug': sample(groups, min(POOL_SIZE, len(groups))) or ['-'],
+            # страница правки открывается автором
+            'own_post_id': own_posts or posts[:1],
+            'kind': list(FORMATS),
+        }
+
+    def url(self, pattern, pools):
+        kwargs = {}
+        for name in pattern.pattern.regex.groupindex:
+            pool = pools[name]
+            if pattern.name == 'post_edit' and name == 'post_id':
+                pool = pools['own_post_id']
+            kwargs[name] = self.random.choice(pool)
+        return reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+
+    @staticmethod
+    def fetch(client, url):
+        response = client.get(url)
+        # потоковое тело строится при чтении, его время тоже считаем
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, client, pattern, pools, requests, warmup):
+        for _ in range(warmup):
+            self.fetch(client, self.url(pattern, pools))
+        timings = []
+        queries = []
+        statuses = Counter()
+        for _ in range(requests):
+            url = self.url(pattern, pools)
+            started = time.perf_counter()
+            response = self.fetch(client, url)
+            timings.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+            match = QUERIES.search(response.get('Server-Timing', ''))
+            if match:
+                queries.append(int(match.group(1)))
+        total = sum(timings)
+        timings = sorted(timing * 1000 for timing in timings)
+        return {
+            'url': url,
+            'requests': requests,
+            'rps': requests / total if total else None,
+            'mean_ms': sum(timings) / len(timings) if timings else None,
+            'p50_ms': percentile(timings, 0.5),
+            'p99_ms': percentile(timings, 0.99),
+            'max_queries': max(queries) if queries else None,
+            'statuses': {str(code): n for code, n in statuses.items()},
+        }
+
+    def meta(self, options):
+        return {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"url":<20} {"rps":>8} {"p50 ms":>8} {"p99 ms":>8} '
+            f'{"SQL":>4}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20} {result["rps"] or 0:>8.1f} '
+                f'{result["p50_ms"] or 0:>8.2f} '
+                f'{result["p99_ms"] or 0:>8.2f} '
+                f'{result["max_queries"] or 0:>4}')
+
+    def compare(self, results, baseline, threshold):
+        """Печатает изменения относительно прошлого прогона и
+        возвращает имена URL, ставших медленнее порога."""
+        regressions = []
+        self.stdout.write(
+            f'\n{"url":<20} {"rps":>8} {"p50":>8} {"p99":>8}')
+        for name, result in results.items():
+            old = baseline.get(name)
+            if old is None:
+                continue
+            deltas = [
+                change(result[key], old.get(key))
+                for key in ('rps', 'p50_ms', 'p99_ms')
+            ]
+            worse = any(
+                delta is not None and delta > threshold
+                for delta in deltas[1:]
+            )
+            if worse:
+                regressions.append(name)
+            self.stdout.write(
+                f'{name:<20} ' + ' '.join(
+                    f'{delta:>+8.1%}' if delta is not None else f'{"-":>8}'
+                    for delta in deltas
+                ) + ('  ухудшение' if worse else ''))
+        return regressions
@@ -0,0 +1,74 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.bulk import FORMATS, POST_FIELDS, detect_format
+from posts.models import Post
+
+COLUMNS = ('pk', 'author__username', 'group__slug', 'text', 'pub_date',
+           'image')
+
+
+class Command(BaseCommand):
+    help = 'Потоком выгружает посты в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Путь к файлу или - для stdout')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--author', help='Только посты автора')
+        parser.add_argument('--group', help='Только посты группы (slug)')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        posts = Post.objects.order_by('pk').values_list(*COLUMNS)
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        rows = posts.iterator(chunk_size=options['batch_size'])
+        write = (
+            self.write_csv if detect_format(path, options['format']) == 'csv'
+            else self.write_jsonl
+        )
+        started = time.perf_counter()
+        if path == '-':
+            count = write(self.stdout, rows)
+            report = self.stderr
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                count = write(stream, rows)
+            report = self.stdout
+        elapsed = time.perf_counter() - started
+        report.write(
+            f'Выгружено постов: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)')
+
+    @staticmethod
+    def values(row):
+        *head, pub_date, image = row
+        return [*head, pub_date.isoformat(), image or '']
+
+    def write_jsonl(self, stream, rows):
+        count = 0
+        for row in rows:
+            stream.write(json.dumps(
+                dict(zip(POST_FIELDS, self.values(row))),
+                ensure_ascii=False,
+            ) + '\n')
+            count += 1
+        return count
+
+    def write_csv(self, stream, rows):
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(POST_FIELDS)
+        count = 0
+        for row in rows:
+            writer.writerow(self.values(row))
+            count += 1
+        return count
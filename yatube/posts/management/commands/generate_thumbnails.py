@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Ставит в очередь задач построение миниатюр для картинок '
+            'всех постов; готовые миниатюры не перестраиваются')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').values_list('pk', flat=True)
+        count = 0
+        for post_id in posts.iterator():
+            thumbnails.build.delay(post_id=post_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Поставлено в очередь картинок: {count}'))
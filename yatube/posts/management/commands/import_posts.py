@@ -0,0 +1,210 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.db.transactions import atomic_write
+from posts import search, timeline
+from posts.bulk import (FORMATS, POST_FIELDS, bulk_insert, chunks,
+                        detect_format, insert_returning_ids, manual_field)
+from posts.cache import bump_posts_count, touch
+from posts.models import Group, Post, UserStats
+
+User = get_user_model()
+
+
+class Lookup:
+    """Кеш «ключ -> id» на время импорта: недостающие ключи
+    пачки ищутся одним запросом, отсутствующие тоже запоминаются."""
+
+    def __init__(self, model, field, create=None):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        if not missing:
+            return
+        for part in chunks(missing, 500):
+            self.ids.update(self.model.objects.filter(
+                **{f'{self.field}__in': part}).values_list(self.field, 'pk'))
+        unknown = [key for key in missing if key not in self.ids]
+        if unknown and self.create:
+            bulk_insert(self.model, [self.create(key) for key in unknown])
+            # поле уникально: по нему же находим созданные записи
+            created = {}
+            for part in chunks(unknown, 500):
+                created.update(self.model.objects.filter(
+                    **{f'{self.field}__in': part}).values_list(
+                        self.field, 'pk'))
+            self.ids.update(created)
+            self.created(created.values())
+        for key in unknown:
+            self.ids.setdefault(key, None)
+
+    def created(self, ids):
+        if self.model is User:
+            bulk_insert(UserStats, [UserStats(user_id=pk) for pk in ids])
+
+    def __getitem__(self, key):
+        return self.ids.get(key)
+
+
+class Command(BaseCommand):
+    help = ('Потоком загружает посты из JSON Lines или CSV '
+            '(формат export_posts)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Путь к файлу или - для stdin')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Строк в одном INSERT',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Строк в одной транзакции',
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать неизвестных авторов без пароля',
+        )
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать неизвестные группы с заголовком, равным slug',
+        )
+
+    def handle(self, *args, **options):
+        password = make_password(None)
+        self.authors = Lookup(
+            User, 'username',
+            options['create_authors'] and (
+                lambda username: User(username=username, password=password)),
+        )
+        self.groups = Lookup(
+            Group, 'slug',
+            options['create_groups'] and (
+                lambda slug: Group(title=slug, slug=slug, description='')),
+        )
+        self.now = timezone.now()
+        self.imported = self.skipped = 0
+        self.started = time.perf_counter()
+        path = options['input']
+        format_ = detect_format(path, options['format'])
+        if path == '-':
+            self.load(sys.stdin, format_, options)
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                self.load(stream, format_, options)
+        touch()
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {self.imported}, '
+            f'пропущено: {self.skipped}, {self.rate()}'))
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return (f'{elapsed:.1f} с '
+                f'({self.imported / max(elapsed, 1e-9):.0f} строк/с)')
+
+    def load(self, stream, format_, options):
+        records = self.read_csv(stream) if format_ == 'csv' else (
+            self.read_jsonl(stream))
+        for chunk in chunks(records, options['chunk_size']):
+            with atomic_write():
+                self.import_chunk(chunk, options['batch_size'])
+            self.stdout.write(
+                f'{self.imported} строк, {self.rate()}')
+
+    def read_jsonl(self, stream):
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record
+
+    def read_csv(self, stream):
+        # строка 1 — заголовок
+        yield from enumerate(csv.DictReader(stream), 2)
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'строка {number}: {reason}')
+
+    def check(self, number, record):
+        """Отсеивает строки, которые не объект с текстовыми полями:
+        в JSON автор может оказаться числом или списком."""
+        if not isinstance(record, dict):
+            return self.skip(number, 'не разобрана')
+        for name in POST_FIELDS[1:]:
+            value = record.get(name)
+            if value is not None and not isinstance(value, str):
+                return self.skip(number, f'{name} не строка')
+        return True
+
+    def import_chunk(self, chunk, batch_size):
+        records = [
+            (number, record) for number, record in chunk
+            if self.check(number, record)
+        ]
+        self.authors.resolve(
+            {r.get('author') for _, r in records} - {None, ''})
+        self.groups.resolve({r.get('group') for _, r in records} - {None, ''})
+        posts = [
+            post for post in (
+                self.build(number, record) for number, record in records)
+            if post is not None
+        ]
+        with manual_field(Post, 'pub_date'):
+            created = insert_returning_ids(Post, posts, batch_size)
+        # сигналы при bulk_create не срабатывают
+        UserStats.bump_many('posts_count', Counter(
+            post.author_id for post in posts))
+        Group.objects.filter(pk__in={
+            post.group_id for post in posts
+        }).recount_posts()
+        bump_posts_count(len(created))
+        timeline.fan_out_posts(created)
+        search.index_posts(created)
+        self.imported += len(created)
+
+    def build(self, number, record):
+        author_id = self.authors[record.get('author')]
+        if author_id is None:
+            return self.skip(number, 'неизвестный автор')
+        text = record.get('text')
+        if not text:
+            return self.skip(number, 'нет текста')
+        group_id = None
+        if record.get('group'):
+            group_id = self.groups[record['group']]
+            if group_id is None:
+                return self.skip(number, 'неизвестная группа')
+        pub_date = self.now
+        if record.get('pub_date'):
+            try:
+                pub_date = parse_datetime(record['pub_date'])
+            except ValueError:
+                pub_date = None
+            if pub_date is None:
+                return self.skip(number, 'неверная дата')
+            if timezone.is_naive(pub_date):
+                pub_date = timezone.make_aware(pub_date)
+        return Post(
+            author_id=author_id,
+            group_id=group_id,
+            text=text,
+            pub_date=pub_date,
+            image=record.get('image') or '',
+        )
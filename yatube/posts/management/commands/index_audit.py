@@ -0,0 +1,72 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, Group, Post
+from posts.timeline import timeline_posts
+
+User = get_user_model()
+
+# SQLite: «SCAN posts_post» без индекса, PostgreSQL: «Seq Scan on ...»
+FULL_SCAN = re.compile(r'\bSCAN\b(?!.*\bUSING\b.*\bINDEX\b)|Seq Scan')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE|Sort Key')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов представлений posts '
+            'и отмечает полные просмотры таблиц')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться с ошибкой, если найден полный просмотр',
+        )
+
+    def get_queries(self):
+        limit = settings.COUNT_POSTS
+        group = Group.objects.first()
+        author = User.objects.filter(posts__isnull=False).first()
+        post = Post.objects.first()
+        queries = {
+            'posts:index': Post.objects.for_feed(),
+        }
+        if group is not None:
+            queries['posts:group_list'] = Post.objects.for_feed().filter(
+                group=group)
+        if author is not None:
+            queries['posts:profile'] = author.posts.for_feed()
+            queries['posts:follow_index'] = timeline_posts(author)
+        if post is not None:
+            comments = Comment.objects.filter(post=post)
+            # последний комментарий для ETag, корни страницы и их ветки
+            queries['post_validator'] = comments.order_by(
+                '-created', '-id')
+            queries['posts:post_detail'] = comments.filter(
+                depth=0).order_by('path')
+            queries['posts:post_comments'] = comments.branches(
+                '0', '9', settings.COMMENT_THREAD_DEPTH).select_related(
+                    'author')
+        return {
+            name: queryset[:limit] for name, queryset in queries.items()
+        }
+
+    def handle(self, *args, **options):
+        flagged = []
+        for name, queryset in self.get_queries().items():
+            plan = queryset.explain()
+            problems = [
+                line.strip() for line in plan.splitlines()
+                if FULL_SCAN.search(line) or TEMP_SORT.search(line)
+            ]
+            if problems:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(name))
+            else:
+                self.stdout.write(self.style.SUCCESS(name))
+            self.stdout.write(plan)
+            self.stdout.write('')
+        if flagged and options['strict']:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(flagged))
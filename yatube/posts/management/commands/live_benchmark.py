@@ -0,0 +1,253 @@
+"""Сколько простаивающих соединений SSE держит один воркер.
+
+В процессе поднимается многопоточный WSGI-сервер (поток на соединение,
+как runserver или gunicorn с --worker-class gthread), к /live/
+открываются соединения ступенями до --connections. После каждой
+ступени печатается число потоков, память процесса (VmRSS) на
+соединение, число подписок брокера и время, за которое новый пост
+доходит событием до всех открытых соединений. Клиенты работают
+в том же процессе, но их сокеты почти не занимают памяти.
+
+С --asgi вместо него приложение yatube/asgi.py обслуживает
+простейший HTTP-сервер на asyncio: соединение ждёт в цикле событий,
+а потоков ровно ASGI_THREADS.
+"""
+import asyncio
+import os
+import resource
+import selectors
+import socket
+import threading
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.urls import reverse
+
+from core import asgi
+from posts.live import broker
+from posts.models import Post
+
+User = get_user_model()
+
+EVENT = b'event: posts'
+
+
+class Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ASGIServer:
+    """HTTP/1.1 для ASGI-приложения в отдельном потоке: запросы без
+    тела, ответ до закрытия соединения. Годится только для замера."""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(
+            target=self.run, args=[started], daemon=True).start()
+        started.wait()
+
+    def run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.connection, '127.0.0.1', 0, backlog=1024))
+        self.server_address = self.server.sockets[0].getsockname()
+        started.set()
+        self.loop.run_forever()
+
+    async def connection(self, reader, writer):
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        request_line, *lines = head.split('\r\n')
+        method, target, _ = request_line.split(' ', 2)
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query.encode('latin-1'),
+            'headers': [
+                (name.strip().lower().encode('latin-1'),
+                 value.strip().encode('latin-1'))
+                for name, value in (
+                    line.split(':', 1) for line in lines if line)
+            ],
+            'http_version': '1.1',
+            'server': self.server_address,
+            'client': writer.get_extra_info('peername'),
+        }
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b''}
+            await reader.read()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                writer.write(
+                    f'HTTP/1.1 {message["status"]} \r\n'.encode()
+                    + b''.join(name + b': ' + value + b'\r\n'
+                               for name, value in message['headers'])
+                    + b'Connection: close\r\n\r\n')
+                return
+            writer.write(message.get('body', b''))
+            if not message.get('more_body'):
+                writer.close()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            writer.close()
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def server_close(self):
+        asgi.shutdown()
+
+
+def process_status():
+    """VmRSS в мегабайтах и число потоков процесса."""
+    with open(f'/proc/{os.getpid()}/status') as file:
+        status = dict(
+            line.split(':', 1) for line in file.read().splitlines())
+    rss = int(status['VmRSS'].split()[0]) / 1024
+    return rss, int(status['Threads'])
+
+
+def raise_file_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+class Clients:
+    def __init__(self, address, path):
+        self.address = address
+        self.request = (
+            f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+            'Accept: text/event-stream\r\n\r\n'
+        ).encode()
+        self.selector = selectors.DefaultSelector()
+        self.sockets = []
+
+    def open(self, count):
+        opened = []
+        for _ in range(count):
+            client = socket.create_connection(self.address)
+            client.sendall(self.request)
+            client.setblocking(False)
+            self.selector.register(client, selectors.EVENT_READ)
+            opened.append(client)
+        self.sockets.extend(opened)
+        return opened
+
+    def wait_events(self, sockets, timeout):
+        """Ждёт событие posts на каждом из sockets и возвращает время
+        до последнего, либо None, если не дождались."""
+        waiting = set(sockets)
+        started = time.perf_counter()
+        deadline = started + timeout
+        while waiting:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                return None
+            for key, _ in self.selector.select(left):
+                data = key.fileobj.recv(65536)
+                if EVENT in data:
+                    waiting.discard(key.fileobj)
+        return time.perf_counter() - started
+
+    def close(self):
+        for client in self.sockets:
+            self.selector.unregister(client)
+            client.close()
+        self.selector.close()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет память и доставку событий при множестве '
+            'простаивающих соединений SSE к одному воркеру')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--step', type=int, default=250)
+        parser.add_argument(
+            '--stack-kb', type=int, default=256,
+            help='Размер стека потока; 0 — по умолчанию системы',
+        )
+        parser.add_argument('--timeout', type=float, default=60)
+        parser.add_argument(
+            '--asgi', action='store_true',
+            help='Обслуживать yatube/asgi.py вместо потока на соединение',
+        )
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(posts__isnull=False).first()
+        if author is None:
+            raise CommandError('База пуста, сначала выполните manage.py seed')
+        limit = raise_file_limit(options['connections'] * 2 + 100)
+        if limit < options['connections'] * 2 + 100:
+            raise CommandError(f'Лимит открытых файлов {limit} слишком мал')
+        if options['stack_kb']:
+            threading.stack_size(options['stack_kb'] * 1024)
+        if options['asgi']:
+            server = ASGIServer(asgi.ASGIHandler())
+        else:
+            server = make_server(
+                '127.0.0.1', 0, get_wsgi_application(),
+                server_class=Server, handler_class=QuietHandler)
+            threading.Thread(
+                target=server.serve_forever, daemon=True).start()
+        clients = Clients(server.server_address, reverse('posts:index_live'))
+        baseline, _ = process_status()
+        self.stdout.write(
+            f'{"conns":>6} {"subs":>6} {"threads":>8} {"RSS MB":>8} '
+            f'{"KB/conn":>8} {"connect s":>10} {"fan-out ms":>11}')
+        created = []
+        try:
+            while len(clients.sockets) < options['connections']:
+                count = min(options['step'],
+                            options['connections'] - len(clients.sockets))
+                opened = clients.open(count)
+                connected = clients.wait_events(opened, options['timeout'])
+                if connected is None:
+                    raise CommandError(
+                        f'Соединения не получили первое событие за '
+                        f'{options["timeout"]} с')
+                post = Post.objects.create(
+                    author=author, text='Пост из замера соединений')
+                created.append(post)
+                fan_out = clients.wait_events(
+                    clients.sockets, options['timeout'])
+                rss, threads = process_status()
+                subscribers = broker.count()
+                total = len(clients.sockets)
+                self.stdout.write(
+                    f'{total:>6} {subscribers:>6} {threads:>8} {rss:>8.1f} '
+                    f'{(rss - baseline) * 1024 / total:>8.1f} '
+                    f'{connected:>10.2f} '
+                    f'{fan_out * 1000 if fan_out else float("nan"):>11.1f}')
+        finally:
+            clients.close()
+            server.shutdown()
+            server.server_close()
+            for post in created:
+                post.delete()
+            connections.close_all()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'Полнотекстовый индекс поддерживается только для SQLite')
+        with transaction.atomic():
+            count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {count}'))
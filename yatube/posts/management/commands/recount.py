@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import reset_posts_count
+from posts.models import Comment, Group, Post, UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев, ответов '
+            'и подписок')
+
+    def handle(self, *args, **options):
+        users = UserStats.recount()
+        groups = Group.objects.recount_posts()
+        posts = Post.objects.recount_comments()
+        Comment.objects.fill_paths()
+        comments = Comment.objects.recount_descendants()
+        reset_posts_count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {users}, групп: {groups}, '
+            f'постов: {posts}, комментариев: {comments}'))
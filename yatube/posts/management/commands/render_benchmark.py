@@ -0,0 +1,106 @@
+"""Время рендеринга шаблонов по страницам: разбор шаблонов на каждый
+запрос (как Django 2.2 при DEBUG=True без явных loaders) против
+cached.Loader с предрендеренными шапкой и подвалом.
+
+Страницы и объекты выбираются так же, как в manage.py benchmark, время
+шаблонов берётся из заголовка Server-Timing (tpl), то есть это время
+рендеринга шаблона верхнего уровня вместе со всеми include.
+"""
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.test import Client, override_settings
+
+from core.middleware.instrumentation import percentile
+from posts import urls
+
+from .benchmark import Command as BenchmarkCommand
+
+TEMPLATE_TIME = re.compile(r'tpl;dur=([\d.]+)')
+DEFAULT_NAMES = ('index', 'group_list', 'profile', 'post_detail',
+                 'follow_index')
+
+
+def profile_settings(name):
+    options = dict(settings.TEMPLATES[0]['OPTIONS'])
+    if name == 'reload':
+        options['loaders'] = settings.TEMPLATE_LOADERS
+    else:
+        options['loaders'] = [
+            ('django.template.loaders.cached.Loader',
+             settings.TEMPLATE_LOADERS),
+        ]
+    templates = [dict(settings.TEMPLATES[0], OPTIONS=options)]
+    return override_settings(
+        TEMPLATES=templates, TEMPLATE_RELOAD=name == 'reload')
+
+
+class Command(BenchmarkCommand):
+    help = ('Сравнивает время рендеринга страниц с разбором шаблонов '
+            'на каждый запрос и с кешем шаблонов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--url', action='append', dest='names', default=None,
+            help='Имя URL без пространства имён; можно повторять',
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or DEFAULT_NAMES
+        patterns = [
+            pattern for pattern in urls.urlpatterns if pattern.name in names]
+        results = {}
+        with override_settings(INSTRUMENTATION_ENFORCE_BUDGETS=False):
+            with transaction.atomic():
+                for profile in ('reload', 'cached'):
+                    # одинаковые URL в обоих профилях
+                    self.random = random.Random(options['seed'])
+                    pools = self.pools()
+                    client = Client()
+                    client.force_login(pools['reader'])
+                    with profile_settings(profile):
+                        for pattern in patterns:
+                            results[pattern.name, profile] = self.measure(
+                                client, pattern, pools,
+                                options['requests'], options['warmup'])
+                transaction.set_rollback(True)
+        self.print_results(patterns, results)
+
+    def measure(self, client, pattern, pools, requests, warmup):
+        for _ in range(warmup):
+            self.fetch(client, self.url(pattern, pools))
+        templates = []
+        totals = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = self.fetch(client, self.url(pattern, pools))
+            totals.append((time.perf_counter() - started) * 1000)
+            match = TEMPLATE_TIME.search(response.get('Server-Timing', ''))
+            if match:
+                templates.append(float(match.group(1)))
+        templates.sort()
+        totals.sort()
+        return {
+            'template_p50_ms': percentile(templates, 0.5),
+            'template_p99_ms': percentile(templates, 0.99),
+            'total_p50_ms': percentile(totals, 0.5),
+        }
+
+    def print_results(self, patterns, results):
+        self.stdout.write(
+            f'{"url":<14} {"profile":<8} {"tpl p50":>8} {"tpl p99":>8} '
+            f'{"total p50":>10}')
+        for pattern in patterns:
+            for profile in ('reload', 'cached'):
+                result = results[pattern.name, profile]
+                self.stdout.write(
+                    f'{pattern.name:<14} {profile:<8} '
+                    f'{result["template_p50_ms"] or 0:>8.2f} '
+                    f'{result["template_p99_ms"] or 0:>8.2f} '
+                    f'{result["total_p50_ms"] or 0:>10.2f}')
@@ -0,0 +1,212 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Активность авторов и популярность постов распределены по закону Ципфа,
+число подписок пользователя — по Парето, поэтому в графе подписок есть
+несколько «звёзд» с тысячами подписчиков и длинный хвост. Всё пишется
+через bulk_create пачками, сигналы не срабатывают, и счётчики, ленты
+и поисковый индекс пересчитываются в конце.
+"""
+import bisect
+import itertools
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.db.transactions import atomic_write
+from posts import search, timeline
+from posts.bulk import bulk_insert, chunks, last_id, manual_field
+from posts.cache import reset_posts_count, touch
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+WORDS = (
+    'лес море город ночь утро дорога книга песня ветер дом окно '
+    'снег лето поезд кофе мост река свет гора письмо сад звезда'
+).split()
+
+
+def zipf_weights(size, exponent=1.1):
+    """Накопленные веса для random.choices: элемент с рангом i
+    выбирается пропорционально 1 / (i + 1) ** exponent."""
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу пользователями, постами, подписками и комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя',
+        )
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней разбросать даты',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+        users = self.step(
+            'пользователей', self.create_users,
+            options['users'], options['prefix'])
+        groups = self.step(
+            'групп', self.create_groups, options['groups'], options['prefix'])
+        weights = zipf_weights(len(users))
+        # активность авторов не связана с их популярностью: иначе
+        # самые читаемые авторы пишут больше всех и ленты раздуваются
+        writers = array('q', users)
+        self.random.shuffle(writers)
+        posts = self.step(
+            'постов', self.create_posts,
+            options['posts'], writers, weights, groups)
+        self.step(
+            'подписок', self.create_follows,
+            options['follows'], users, weights)
+        self.step(
+            'комментариев', self.create_comments,
+            options['comments'], users, posts)
+        self.step('записей в лентах', self.recount)
+        touch()
+
+    def step(self, title, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - started
+        count = len(result) if hasattr(result, '__len__') else result
+        self.stdout.write(
+            f'{title}: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)')
+        return result
+
+    def insert(self, model, objects):
+        for chunk in chunks(objects, self.batch_size):
+            with transaction.atomic():
+                bulk_insert(model, chunk)
+
+    def new_ids(self, queryset, after):
+        """id созданных строк: SQLite не возвращает их из bulk_create."""
+        return array('q', queryset.filter(pk__gt=after).order_by(
+            'pk').values_list('pk', flat=True).iterator())
+
+    def pub_date(self):
+        return self.now - timedelta(seconds=self.random.random() * self.span)
+
+    def text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize()
+
+    def create_users(self, count, prefix):
+        after = last_id(User)
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(None)
+        self.insert(User, (
+            User(
+                username=f'{prefix}{number}',
+                first_name='Автор',
+                last_name=str(number),
+                password=password,
+            )
+            for number in range(start, start + count)
+        ))
+        return self.new_ids(User.objects.all(), after)
+
+    def create_groups(self, count, prefix):
+        after = last_id(Group)
+        start = Group.objects.filter(slug__startswith=prefix).count()
+        self.insert(Group, (
+            Group(
+                title=f'Группа {number}',
+                slug=f'{prefix}-{number}',
+                description=self.text(20),
+            )
+            for number in range(start, start + count)
+        ))
+        return self.new_ids(Group.objects.all(), after)
+
+    def create_posts(self, count, users, authors, groups):
+        after = last_id(Post)
+        group_choices = list(groups) + [None] * len(groups)
+        with manual_field(Post, 'pub_date'):
+            self.insert(Post, (
+                Post(
+                    author_id=users[bisect.bisect(
+                        authors, self.random.random() * authors[-1])],
+                    group_id=(
+                        self.random.choice(group_choices)
+                        if group_choices else None),
+                    text=self.text(self.random.randint(5, 60)),
+                    pub_date=self.pub_date(),
+                )
+                for _ in range(count)
+            ))
+        return self.new_ids(Post.objects.all(), after)
+
+    def create_follows(self, mean, users, authors):
+        # среднее распределения Парето с alpha = 1.5 равно трём
+        def follows():
+            for user_id in users:
+                wanted = min(
+                    int(self.random.paretovariate(1.5) * mean / 3),
+                    len(users) - 1,
+                )
+                chosen = set()
+                for _ in range(wanted * 2):
+                    if len(chosen) >= wanted:
+                        break
+                    author_id = users[bisect.bisect(
+                        authors, self.random.random() * authors[-1])]
+                    if author_id != user_id:
+                        chosen.add(author_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        before = Follow.objects.count()
+        self.insert(Follow, follows())
+        return Follow.objects.count() - before
+
+    def create_comments(self, count, users, posts):
+        if not posts:
+            return 0
+        popularity = zipf_weights(len(posts), exponent=0.8)
+        with manual_field(Comment, 'created'):
+            self.insert(Comment, (
+                Comment(
+                    post_id=posts[bisect.bisect(
+                        popularity, self.random.random() * popularity[-1])],
+                    author_id=self.random.choice(users),
+                    text=self.text(self.random.randint(3, 30)),
+                    created=self.pub_date(),
+                )
+                for _ in range(count)
+            ))
+        return count
+
+    @atomic_write()
+    def recount(self):
+        UserStats.recount()
+        Group.objects.recount_posts()
+        Post.objects.recount_comments()
+        Comment.objects.fill_paths()
+        reset_posts_count()
+        entries = timeline.rebuild()
+        if search.is_available():
+            search.rebuild()
+        return entries
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_of(queryset, field):
+    counts = queryset.order_by().values(field).annotate(
+        total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True)],
+        batch_size=500,
+    )
+    user = OuterRef('user')
+    UserStats.objects.update(
+        posts_count=count_of(Post.objects.filter(author=user), 'author'),
+        followers_count=count_of(
+            Follow.objects.filter(author=user), 'author'),
+        following_count=count_of(Follow.objects.filter(user=user), 'user'),
+    )
+    Post.objects.update(comments_count=count_of(
+        Comment.objects.filter(post=OuterRef('pk')), 'post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
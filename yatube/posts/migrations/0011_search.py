@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CREATE_TABLE = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5(
+    text, comments, tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+FILL_TABLE = '''
+INSERT INTO posts_search (rowid, text, comments)
+SELECT post.id, post.text, COALESCE((
+    SELECT group_concat(comment.text, ' ')
+    FROM posts_comment comment WHERE comment.post_id = post.id
+), '')
+FROM posts_post post
+'''
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД поиск работает через LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_TABLE)
+    schema_editor.execute(FILL_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_posts_count(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    counts = Post.objects.filter(group=OuterRef('pk')).order_by().values(
+        'group').annotate(total=Count('pk')).values('total')
+    Group.objects.update(posts_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_posts_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:08
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Cast, LPad
+import django.db.models.deletion
+
+PATH_STEP = 10
+
+
+def fill_paths(apps, schema_editor):
+    # до этой миграции все комментарии — корни
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.update(path=LPad(
+        Cast('pk', models.CharField()), PATH_STEP, Value('0')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_group_posts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='descendants_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'depth', 'path'], name='comment_post_root_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
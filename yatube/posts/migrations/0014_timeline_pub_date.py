@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_timeline(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    TimelineEntry.objects.update(pub_date=Subquery(
+        Post.objects.filter(pk=OuterRef('post')).values('pub_date')))
+    UserStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
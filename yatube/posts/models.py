@@ -1,17 +1,79 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, router
+from django.db.models import (
+    Case, Count, F, OuterRef, Subquery, Value, When)
+from django.db.models.functions import Cast, Coalesce, Concat, LPad
 from django.contrib.auth import get_user_model
 
+from core.db.transactions import atomic_write
+
 User = get_user_model()
 
 
+def atomic_save(instance, using=None):
+    """Транзакция для save(): сигналы posts/signals.py обновляют
+    счётчики, ленты и версию карточки в ней же, и упавшее обновление
+    откатывает саму запись. Удаление Django и так выполняет вместе с
+    сигналами в одной транзакции."""
+    return atomic_write(
+        using or router.db_for_write(type(instance), instance=instance))
+
+
+def count_of(queryset, field):
+    """Подзапрос с числом строк queryset для строки OuterRef(field)."""
+    counts = queryset.order_by().values(field).annotate(
+        total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+class GroupQuerySet(models.QuerySet):
+    def recount_posts(self):
+        return self.update(posts_count=count_of(
+            Post.objects.filter(group=OuterRef('pk')), 'group'))
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    # Поддерживается сигналами, чтобы паджинатор группы не считал COUNT(*)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = GroupQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def bump(cls, group_id, delta=1):
+        """Атомарно меняет число постов, не опуская его ниже нуля."""
+        if group_id is None:
+            return
+        groups = cls.objects.filter(pk=group_id)
+        if delta < 0:
+            groups = groups.filter(posts_count__gte=-delta)
+        groups.update(posts_count=F('posts_count') + delta)
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа подтягиваются одним JOIN,
+        а неиспользуемые в шаблонах колонки не читаются."""
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__email',
+            'author__last_login',
+            'author__date_joined',
+            'author__is_superuser',
+            'author__is_staff',
+            'author__is_active',
+            'group__description',
+        )
+
+    def recount_comments(self):
+        return self.update(comments_count=count_of(
+            Comment.objects.filter(post=OuterRef('pk')), 'post'))
+
 
 class Post(models.Model):
     text = models.TextField()
@@ -34,10 +96,95 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Размеры записываются формой при загрузке, чтобы шаблонам
+    # не приходилось открывать файл
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    # Входит в ключ карточки на главной; растёт при правке поста, его
+    # комментариев и миниатюр (posts/signals.py, posts/cache.py)
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        with atomic_save(self, kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+# Путь комментария — id его предков и его собственный, по PATH_STEP
+# цифр с ведущими нулями. Сортировка по path — обход дерева в глубину,
+# ветка — диапазон [path, path + PATH_END)
+PATH_STEP = 10
+PATH_END = ':'
+
+
+def path_segment(pk):
+    return f'{pk:0{PATH_STEP}d}'
+
+
+def path_ids(path):
+    return [
+        int(path[start:start + PATH_STEP])
+        for start in range(0, len(path), PATH_STEP)
+    ]
+
+
+class CommentQuerySet(models.QuerySet):
+    def branches(self, first, last, max_depth=None):
+        """Комментарии с путями от first до last и все ответы на них
+        одним диапазоном по индексу (post, path), в порядке обхода."""
+        queryset = self.filter(path__gte=first, path__lt=last + PATH_END)
+        if max_depth is not None:
+            queryset = queryset.filter(depth__lte=max_depth)
+        return queryset.order_by('path')
+
+    def fill_paths(self):
+        """Пути для комментариев, созданных bulk_create() в обход
+        save(): корни одним UPDATE, ответы — уровень за уровнем."""
+        filled = self.filter(path__isnull=True, parent__isnull=True).update(
+            path=LPad(Cast('pk', models.CharField()), PATH_STEP, Value('0')),
+            depth=0,
+        )
+        while True:
+            replies = list(self.filter(
+                path__isnull=True, parent__path__isnull=False,
+            ).select_related('parent').only(
+                'pk', 'parent__path', 'parent__depth')[:1000])
+            if not replies:
+                return filled
+            for reply in replies:
+                reply.path = reply.parent.path + path_segment(reply.pk)
+                reply.depth = reply.parent.depth + 1
+            Comment.objects.bulk_update(replies, ['path', 'depth'])
+            filled += len(replies)
+
+    def recount_descendants(self):
+        descendants = Comment.objects.filter(
+            post=OuterRef('post'),
+            path__gt=OuterRef('path'),
+            path__lt=Concat(OuterRef('path'), Value(PATH_END)),
+        )
+        return self.update(descendants_count=count_of(descendants, 'post'))
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -45,6 +192,14 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self',
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='replies',
+        verbose_name='Ответ на',
+    )
     text = models.TextField(
         verbose_name='Текст комментария',
     )
@@ -54,10 +209,56 @@ class Comment(models.Model):
         related_name='comments'
     )
     created = models.DateTimeField('pub_date', auto_now_add=True)
+    # Путь выставляется в save() сразу после вставки, когда известен id
+    path = models.CharField(
+        max_length=255, null=True, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Число ответов во всей ветке, для свёрнутых веток; поддерживается
+    # сигналами
+    descendants_count = models.PositiveIntegerField(
+        default=0, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+            models.Index(
+                fields=['post', 'depth', 'path'],
+                name='comment_post_root_idx'),
+            models.Index(
+                fields=['post', 'path'], name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        if self.pk is None and self.parent is not None:
+            # ответы глубже COMMENT_MAX_DEPTH становятся соседями
+            while self.parent.depth >= settings.COMMENT_MAX_DEPTH:
+                self.parent = self.parent.parent
+            self.depth = self.parent.depth + 1
+        with atomic_save(self, kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if self.path is None:
+                self.path = path_segment(self.pk)
+                if self.parent is not None:
+                    self.path = (
+                        self.parent.path or path_segment(self.parent_id)
+                    ) + self.path
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+    def ancestor_ids(self):
+        if self.path:
+            return path_ids(self.path)[:-1]
+        if self.parent is not None:
+            return self.parent.ancestor_ids() + [self.parent_id]
+        return []
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -70,3 +271,117 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with atomic_save(self, kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя, записанный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Копия Post.pub_date (она не меняется): лента читается диапазоном
+    # индекса записей без сортировки постов
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются при изменениях,
+    чтобы страницы не выполняли COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам, а читаются при открытии
+    # ленты (posts/timeline.py). Меняется, когда followers_count
+    # переходит через TIMELINE_FANOUT_LIMIT
+    celebrity = models.BooleanField(default=False, editable=False)
+
+    @classmethod
+    def bump(cls, user_id, field, delta=1):
+        """Атомарно меняет счётчик, не опуская его ниже нуля."""
+        stats = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+        stats.update(**{field: F(field) + delta})
+
+    @classmethod
+    def bump_many(cls, field, deltas, batch_size=300):
+        """Увеличивает счётчик нескольких пользователей одним UPDATE на
+        batch_size пользователей; deltas — {user_id: приращение >= 0}.
+        На пользователя уходит три параметра, а SQLite принимает не
+        больше 999 на запрос."""
+        deltas = list(deltas.items())
+        updated = 0
+        for start in range(0, len(deltas), batch_size):
+            batch = dict(deltas[start:start + batch_size])
+            updated += cls.objects.filter(user_id__in=batch).update(**{
+                field: F(field) + Case(
+                    *(When(user_id=user_id, then=Value(delta))
+                      for user_id, delta in batch.items()),
+                    output_field=models.PositiveIntegerField(),
+                )
+            })
+        return updated
+
+    @classmethod
+    def get_for(cls, user):
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            cls.objects.get_or_create(user=user)
+            cls.recount(cls.objects.filter(user=user))
+            return cls.objects.get(user=user)
+
+    @classmethod
+    def recount(cls, queryset=None):
+        if queryset is None:
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=pk) for pk in User.objects.filter(
+                        stats__isnull=True).values_list('pk', flat=True)
+                ],
+                ignore_conflicts=True,
+            )
+            queryset = cls.objects.all()
+        user = OuterRef('user')
+        return queryset.update(
+            posts_count=count_of(Post.objects.filter(author=user), 'author'),
+            followers_count=count_of(
+                Follow.objects.filter(author=user), 'author'),
+            following_count=count_of(
+                Follow.objects.filter(user=user), 'user'),
+        )
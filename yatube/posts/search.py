@@ -0,0 +1,204 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+На SQLite используется виртуальная таблица FTS5 ``posts_search``: одна
+строка на пост (rowid = id поста), колонка ``text`` с текстом поста и
+колонка ``comments`` с текстами комментариев. Строки изменённых
+постов пересобирает задача очереди (core/tasks.py), которую ставят
+сигналы, а целиком таблицу — команда ``rebuild_search_index``.
+На других СУБД поиск деградирует до ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.tasks import task
+
+from .bulk import chunks
+from .models import Post
+
+TABLE = 'posts_search'
+# Маркеры подсветки, которые не встречаются в тексте и переживают escape
+MARK_START, MARK_END = '\x02', '\x03'
+WORD = re.compile(r'\w+')
+SNIPPET_TOKENS = 24
+
+CREATE_SQL = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+    text, comments, tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+REBUILD_SQL = f'''
+INSERT INTO {TABLE} (rowid, text, comments)
+SELECT post.id, post.text, COALESCE((
+    SELECT group_concat(comment.text, ' ')
+    FROM posts_comment comment WHERE comment.post_id = post.id
+), '')
+FROM posts_post post
+'''
+
+_available = None
+
+
+def is_available():
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def fts_query(query):
+    """Превращает ввод пользователя в запрос FTS5: все слова
+    обязательны, последнее ищется по префиксу."""
+    words = WORD.findall(query.lower())
+    if not words:
+        return ''
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(text):
+    return mark_safe(
+        escape(text)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def reindex_posts(post_ids):
+    """Пересобирает строки индекса постов: текст и комментарии.
+    Строки удалённых постов пропадают."""
+    if not is_available() or not post_ids:
+        return
+    post_ids = sorted(post_ids)
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})',
+            post_ids,
+        )
+        cursor.execute(
+            REBUILD_SQL + f'WHERE post.id IN ({placeholders})', post_ids)
+
+
+@task(priority=5, batch_size=500)
+def reindex(items):
+    """Задача очереди: сигналы ставят её на каждое изменение поста или
+    комментария, а воркер пересобирает строки пачкой."""
+    reindex_posts({item['post_id'] for item in items})
+
+
+def index_posts(post_ids):
+    """Добавляет в индекс посты, записанные в обход сигналов."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for part in chunks(post_ids, 500):
+            cursor.execute(
+                REBUILD_SQL
+                + f'WHERE post.id IN ({", ".join(["%s"] * len(part))})',
+                part)
+
+
+def rebuild():
+    global _available
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        _available = True
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(REBUILD_SQL)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+class SearchResults:
+    """Ленивая выборка результатов для Paginator: считает совпадения
+    и читает только запрошенный срез, упорядоченный по bm25."""
+
+    def __init__(self, query):
+        self.query = fts_query(query)
+
+    def count(self):
+        if not self.query:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.query],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.query:
+            return []
+        start = index.start or 0
+        with connection.cursor() as cursor:
+            # текст поста весит вдвое больше комментариев
+            cursor.execute(
+                f'''SELECT rowid,
+                    highlight({TABLE}, 0, %s, %s),
+                    snippet({TABLE}, 1, %s, %s, '…', %s)
+                FROM {TABLE} WHERE {TABLE} MATCH %s
+                ORDER BY bm25({TABLE}, 2.0, 1.0)
+                LIMIT %s OFFSET %s''',
+                [MARK_START, MARK_END, MARK_START, MARK_END,
+                 SNIPPET_TOKENS, self.query, index.stop - start, start],
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([row[0] for row in rows])
+        results = []
+        for pk, text, comments in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.highlighted_text = highlight(text)
+            post.comment_snippet = (
+                highlight(comments) if MARK_START in comments else '')
+            results.append(post)
+        return results
+
+
+class FallbackResults:
+    """Поиск через LIKE для СУБД без FTS5."""
+
+    def __init__(self, query):
+        words = WORD.findall(query)
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(text__icontains=word) | Q(comments__text__icontains=word))
+        self.queryset = (
+            Post.objects.for_feed().filter(condition).distinct()
+            if words else Post.objects.none()
+        )
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        posts = self.queryset[index]
+        for post in posts if isinstance(index, slice) else [posts]:
+            post.highlighted_text = post.text
+            post.comment_snippet = ''
+        return posts
+
+
+def search(query):
+    if is_available():
+        return SearchResults(query)
+    return FallbackResults(query)
@@ -0,0 +1,126 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import live, search, timeline
+from .cache import bump_posts_count, touch
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+# Поля пользователя, которые видны в лентах и API
+USER_DISPLAY_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.get_or_create(user_id=instance.pk)
+    elif update_fields is None or USER_DISPLAY_FIELDS & set(update_fields):
+        # вход обновляет только last_login и отметку не трогает
+        touch()
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # прежняя группа нужна, чтобы перенести пост между счётчиками групп
+    instance._saved_group_id = None
+    if instance.pk and not raw:
+        saved = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'card_version').first()
+        if saved is not None:
+            instance._saved_group_id, version = saved
+            # новая версия карточки на главной уходит тем же UPDATE
+            instance.card_version = version + 1
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.bump(instance.author_id, 'posts_count')
+        Group.bump(instance.group_id)
+        bump_posts_count(1)
+        timeline.fan_out(instance)
+        touch()
+        transaction.on_commit(partial(live.publish_post, instance))
+    else:
+        if not raw and instance._saved_group_id != instance.group_id:
+            Group.bump(instance._saved_group_id, -1)
+            Group.bump(instance.group_id)
+        touch()
+    if not raw:
+        search.reindex.delay(post_id=instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, 'posts_count', -1)
+    Group.bump(instance.group_id, -1)
+    bump_posts_count(-1)
+    touch()
+    search.reindex.delay(post_id=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, raw=False, **kwargs):
+    # описание группы видно на её странице и в API
+    if not raw:
+        touch()
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1,
+            card_version=F('card_version') + 1)
+        ancestors = instance.ancestor_ids()
+        if ancestors:
+            Comment.objects.filter(pk__in=ancestors).update(
+                descendants_count=F('descendants_count') + 1)
+        touch()
+        search.reindex.delay(post_id=instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=Greatest(F('comments_count') - 1, 0),
+        card_version=F('card_version') + 1)
+    # при удалении ветки каскадом сигнал приходит для каждого ответа
+    ancestors = instance.ancestor_ids()
+    if ancestors:
+        Comment.objects.filter(
+            pk__in=ancestors, descendants_count__gt=0
+        ).update(descendants_count=F('descendants_count') - 1)
+    touch()
+    search.reindex.delay(post_id=instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.bump(instance.user_id, 'following_count')
+        UserStats.bump(instance.author_id, 'followers_count')
+        timeline.follower_added(instance.author_id)
+        timeline.add_author(instance.user_id, instance.author_id)
+        touch()
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.user_id, 'following_count', -1)
+    UserStats.bump(instance.author_id, 'followers_count', -1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    timeline.follower_removed(instance.author_id)
+    touch()
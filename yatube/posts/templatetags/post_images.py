@@ -0,0 +1,42 @@
+import logging
+
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html',
+                        takes_context=True)
+def post_image(context, post, geometry):
+    """Готовая миниатюра картинки поста или заглушка, пока её строят.
+    Миниатюры постов страницы ``page_obj`` читаются из kvstore разом
+    при первом вызове."""
+    image = post.image
+    thumbnail = None
+    if image:
+        try:
+            page = context.get('page_obj')
+            if page is not None and 'post_images' not in (
+                    context.render_context):
+                context.render_context['post_images'] = True
+                thumbnails.prefetch(page)
+            thumbnail = thumbnails.ready_thumbnail(image, geometry)
+            if thumbnail is None:
+                thumbnails.schedule(post)
+        except Exception:
+            # как и {% thumbnail %}, не роняем страницу из-за картинки
+            if getattr(settings, 'THUMBNAIL_DEBUG', False):
+                raise
+            logger.exception('Миниатюра для %s недоступна', image)
+    width, height = thumbnails.thumbnail_size(post, geometry)
+    return {
+        'image': image,
+        'thumbnail': thumbnail,
+        'width': width,
+        'height': height,
+    }
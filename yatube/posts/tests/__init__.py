@@ -0,0 +1,32 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+
+class TempMediaMixin:
+    """Файлы, загруженные тестами класса, пишутся во временный каталог
+    MEDIA_ROOT, который удаляется после класса."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.remove_media()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.remove_media()
+
+    @classmethod
+    def remove_media(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
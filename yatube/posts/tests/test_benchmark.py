@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..management.commands.benchmark import LIVE_URLS
+from ..models import Comment, Follow, Post, TimelineEntry, UserStats
+from .. import urls
+
+
+class SeedBenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed', users=20, groups=3, posts=200, follows=4, comments=100,
+            stdout=StringIO(),
+        )
+
+    def test_seed_fills_counters(self):
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 200)
+
+    def test_benchmark_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            out = StringIO()
+            started = time.monotonic()
+            call_command(
+                'benchmark', requests=3, warmup=1, output=output,
+                stdout=out,
+            )
+            # long-poll живых лент не ждёт LIVE_POLL_TIMEOUT на запрос
+            self.assertLess(time.monotonic() - started, 10)
+            with open(output) as file:
+                report = json.load(file)
+            self.assertEqual(report['meta']['rows']['posts'], 200)
+            self.assertEqual(
+                set(report['results']),
+                {pattern.name for pattern in urls.urlpatterns} - LIVE_URLS,
+            )
+            index = report['results']['index']
+            self.assertEqual(index['statuses'], {'200': 3})
+            self.assertLessEqual(index['p50_ms'], index['p99_ms'])
+            call_command(
+                'benchmark', requests=3, warmup=0, compare=output,
+                url=['index'], stdout=out,
+            )
+            started = time.monotonic()
+            call_command(
+                'benchmark', requests=1, warmup=0, url=['index_live'],
+                stdout=out,
+            )
+            self.assertLess(time.monotonic() - started, 5)
+        # изменения, сделанные во время замера, откатываются
+        self.assertEqual(Post.objects.count(), 200)
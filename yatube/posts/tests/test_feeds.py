@@ -0,0 +1,107 @@
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост <{number}>')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def urls(self, kind):
+        return [
+            reverse('posts:index_feed', args=[kind]),
+            reverse('posts:group_feed', args=['group', kind]),
+            reverse('posts:profile_feed', args=['author', kind]),
+        ]
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        body = (b''.join(response.streaming_content) if response.streaming
+                else response.content)
+        return response, body
+
+    def test_feeds(self):
+        for url in self.urls('atom'):
+            with self.subTest(url=url):
+                response, body = self.get(url)
+                self.assertEqual(
+                    response['Content-Type'],
+                    'application/atom+xml; charset=utf-8')
+                root = ElementTree.fromstring(body)
+                titles = [entry.find(f'{ATOM}title').text
+                          for entry in root.iter(f'{ATOM}entry')]
+                self.assertEqual(titles, ['Пост <2>', 'Пост <1>', 'Пост <0>'])
+        for url in self.urls('rss'):
+            with self.subTest(url=url):
+                response, body = self.get(url)
+                channel = ElementTree.fromstring(body).find('channel')
+                self.assertEqual(len(channel.findall('item')), 3)
+                self.assertEqual(
+                    channel.find('item/link').text,
+                    'http://testserver' + reverse(
+                        'posts:post_detail', args=[self.posts[-1].pk]))
+
+    def test_unknown_feeds(self):
+        for url in ('/feed/json/',
+                    reverse('posts:group_feed', args=['nogroup', 'rss']),
+                    reverse('posts:profile_feed', args=['nobody', 'rss'])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_body_and_not_modified(self):
+        url = self.urls('atom')[1]
+        response, body = self.get(url)
+        self.assertTrue(response.streaming)
+        self.assertIn('public', response['Cache-Control'])
+        # тело из кеша: остаётся только запрос валидатора
+        with self.assertNumQueries(1):
+            cached, cached_body = self.get(url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached_body, body)
+        response, _ = self.get(url, HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, group=self.group, text='Новый')
+        response, body = self.get(url, HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Новый'.encode(), body)
+
+    def test_cached_body_is_per_host_and_scheme(self):
+        url = reverse('posts:index_feed', args=['rss'])
+        self.get(url)
+        requests = [
+            ({'HTTP_HOST': 'localhost'}, 'http://localhost/'),
+            ({'secure': True}, 'https://testserver/'),
+        ]
+        for headers, origin in requests:
+            with self.subTest(origin=origin):
+                _, body = self.get(url, **headers)
+                link = ElementTree.fromstring(body).find('channel/item/link')
+                self.assertTrue(link.text.startswith(origin))
+
+    def test_etag_is_shared_by_users(self):
+        url = self.urls('rss')[0]
+        client = Client()
+        client.force_login(self.author)
+        self.assertEqual(
+            self.client.get(url)['ETag'], client.get(url)['ETag'])
@@ -1,20 +1,18 @@
 from http import HTTPStatus
+from io import BytesIO
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-import shutil
-import tempfile
 from posts.models import Group, Post, Comment
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.conf import settings
+from PIL import Image
 
-User = get_user_model()
+from . import TempMediaMixin
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostFormTests(TestCase):
+class PostFormTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -30,11 +28,6 @@ class PostFormTests(TestCase):
             group=cls.group,
         )
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         # Создаем авторизованный клиент (автор поста)
         self.authorized_author_client = Client()
@@ -76,7 +69,7 @@ class PostFormTests(TestCase):
                 text='Тестовый текст',
                 group=PostFormTests.group.id,
                 author=PostFormTests.post.author,
-                image=PostFormTests.post.image
+                image__startswith='posts/small'
             ).exists()
         )
 
@@ -141,3 +134,57 @@ class PostFormTests(TestCase):
                 author=PostFormTests.post.author,
             ).exists()
         )
+
+
+@override_settings(
+    IMAGE_UPLOAD_MAX_SIZE=(100, 100),
+    IMAGE_UPLOAD_FORMAT='JPEG',
+)
+class ImageUploadTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_upload_is_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile(
+            'photo.jpeg', buffer.getvalue(), content_type='image/jpeg')
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertFalse(stored.getexif())
+
+    def test_transparent_upload_is_stored_as_png_without_exif(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        exif[0x0110] = 'Модель'
+        buffer = BytesIO()
+        Image.new('RGBA', (400, 200), (255, 0, 0, 128)).save(
+            buffer, 'PNG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile(
+            'photo.png', buffer.getvalue(), content_type='image/png')
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Прозрачное фото', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Прозрачное фото')
+        self.assertTrue(post.image.name.endswith('.png'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.mode, 'RGBA')
+            self.assertEqual(stored.size, (100, 50))
+            self.assertNotIn('exif', stored.info)
+            self.assertFalse(stored.getexif())
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.tests import asgi_request
+
+from .. import live
+from ..cache import bump_published
+from ..models import Group, Post
+
+User = get_user_model()
+
+EVENT_STREAM = 'text/event-stream'
+
+
+class BrokerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.broker = live.Broker()
+
+    def test_publish_wakes_subscribers_of_channel(self):
+        subscription = self.broker.subscribe(['group:1'])
+        other = self.broker.subscribe(['group:2'])
+        seen = subscription.state()
+        timer = threading.Timer(
+            0.05, self.broker.publish, [['index', 'group:1'], 7])
+        timer.start()
+        state, published = subscription.wait(seen, 5)
+        timer.join()
+        self.assertEqual(published, [7])
+        self.assertEqual(other.state(), (0, 0))
+        self.broker.unsubscribe(subscription)
+        self.broker.unsubscribe(other)
+        self.assertEqual(self.broker.count(), 0)
+
+    def test_check_detects_posts_of_other_processes(self):
+        counters = live.published_count(), self.broker.published
+        bump_published()
+        self.broker.publish(['index'], 1)
+        counters, foreign = self.broker.check(*counters)
+        self.assertFalse(foreign)
+        # пост другого воркера увеличил только общий счётчик
+        bump_published()
+        counters, foreign = self.broker.check(*counters)
+        self.assertTrue(foreign)
+        cache.clear()
+        self.assertTrue(self.broker.check(*counters)[1])
+
+
+@override_settings(LIVE_HEARTBEAT=0.05, LIVE_MAX_SECONDS=0.3,
+                   LIVE_POLL_TIMEOUT=0.05)
+class LiveViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='live', description='Описание')
+        cls.old = Post.objects.create(author=cls.author, text='Старый')
+        cls.new = [
+            Post.objects.create(
+                author=cls.author, text=f'Новый {index}', group=cls.group)
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def read_stream(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_stream_counts_new_posts_and_publications(self):
+        url = reverse('posts:index_live') + f'?after={self.old.pk}'
+        timer = threading.Timer(
+            0.1, live.broker.publish,
+            [['index'], self.new[-1].pk + 1])
+        response = self.client.get(url, HTTP_ACCEPT=EVENT_STREAM)
+        timer.start()
+        body = self.read_stream(response)
+        timer.join()
+        self.assertEqual(response['Content-Type'], EVENT_STREAM)
+        self.assertIn('"new": 2', body)
+        self.assertIn('"new": 3', body)
+        self.assertIn(': heartbeat', body)
+        self.assertEqual(live.broker.count(), 0)
+
+    def test_stream_ignores_posts_already_counted(self):
+        url = reverse('posts:index_live') + f'?after={self.old.pk}'
+        timer = threading.Timer(
+            0.1, live.broker.publish, [['index'], self.new[-1].pk])
+        response = self.client.get(url, HTTP_ACCEPT=EVENT_STREAM)
+        timer.start()
+        body = self.read_stream(response)
+        timer.join()
+        self.assertEqual(body.count('event: posts'), 1)
+
+    def test_stream_closed_before_reading_unsubscribes(self):
+        response = self.client.get(
+            reverse('posts:index_live'), HTTP_ACCEPT=EVENT_STREAM)
+        self.assertEqual(live.broker.count(), 1)
+        # клиент ушёл раньше, чем сервер начал читать тело
+        response.close()
+        self.assertEqual(live.broker.count(), 0)
+
+    def test_long_poll(self):
+        url = reverse('posts:group_live', args=[self.group.slug])
+        response = self.client.get(url, {'after': self.old.pk})
+        self.assertEqual(
+            json.loads(response.content),
+            {'new': 2, 'more': False, 'after': self.old.pk})
+        # клиент уже знает о двух постах: ответ по таймауту
+        response = self.client.get(url, {'after': self.old.pk, 'known': 2})
+        self.assertEqual(json.loads(response.content)['new'], 2)
+        response = self.client.get(url)
+        self.assertEqual(
+            json.loads(response.content),
+            {'new': 0, 'more': False, 'after': self.new[-1].pk})
+
+    def test_unknown_group_and_anonymous_follow(self):
+        response = self.client.get(
+            reverse('posts:group_live', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('posts:follow_live'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(LIVE_HEARTBEAT=0.05, LIVE_MAX_SECONDS=5,
+                   LIVE_POLL_TIMEOUT=0.05)
+class AsyncLiveViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='live', description='Описание')
+        cls.old = Post.objects.create(author=cls.user, text='Старый')
+        cls.new = Post.objects.create(
+            author=cls.user, text='Новый', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stream_until_disconnect(self):
+        timer = threading.Timer(
+            0.1, live.broker.publish, [['index'], self.new.pk + 1])
+        timer.start()
+        status, headers, chunks = asgi_request(
+            reverse('posts:index_live'), f'after={self.old.pk}',
+            headers=[('Accept', EVENT_STREAM)], disconnect_after=0.3)
+        timer.join()
+        body = b''.join(chunks).decode()
+        self.assertEqual(headers[b'Content-Type'], EVENT_STREAM.encode())
+        self.assertIn('"new": 1', body)
+        self.assertIn('"new": 2', body)
+        self.assertIn(': heartbeat', body)
+        # клиент ушёл: подписка снята
+        self.assertEqual(live.broker.count(), 0)
+
+    def test_stream_closed_before_reading_unsubscribes(self):
+        request = RequestFactory().get(
+            reverse('posts:index_live'), HTTP_ACCEPT=EVENT_STREAM)
+
+        async def run():
+            response = await live.async_live_response(
+                request, ['index'], Post.objects.all())
+            self.assertEqual(live.broker.count(), 1)
+            await response.aclose()
+
+        asyncio.run(run())
+        self.assertEqual(live.broker.count(), 0)
+
+    def test_long_poll(self):
+        status, _, chunks = asgi_request(
+            reverse('posts:group_live', args=[self.group.slug]),
+            f'after={self.old.pk}&known=1')
+        self.assertEqual(json.loads(b''.join(chunks)), {
+            'new': 1, 'more': False, 'after': self.old.pk})
+
+    def test_unknown_group_and_anonymous_follow(self):
+        status, _, _ = asgi_request(
+            reverse('posts:group_live', args=['missing']))
+        self.assertEqual(status, 404)
+        status, headers, _ = asgi_request(reverse('posts:follow_live'))
+        self.assertEqual(status, 302)
+        self.assertTrue(headers[b'Location'].startswith(b'/auth/login/'))
+
+    def test_follow_for_logged_in_user(self):
+        client = Client()
+        client.force_login(self.user)
+        cookie = client.cookies['sessionid'].value
+        status, _, chunks = asgi_request(
+            reverse('posts:follow_live'), 'after=0',
+            headers=[('Cookie', f'sessionid={cookie}')])
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(b''.join(chunks))['new'], 0)
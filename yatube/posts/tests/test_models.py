@@ -1,7 +1,12 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -30,3 +35,143 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(UserStats.get_for(self.author).posts_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (0, 0))
+
+    def test_failed_counter_update_rolls_back_write(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        writes = [
+            lambda: Post.objects.create(author=self.author, text='Второй'),
+            lambda: Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'),
+            lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+        ]
+        for write in writes:
+            with self.subTest(write=write):
+                with mock.patch.object(
+                        UserStats, 'bump', side_effect=DatabaseError), \
+                        mock.patch.object(
+                            Post.objects, 'filter',
+                            side_effect=DatabaseError):
+                    with self.assertRaises(DatabaseError):
+                        write()
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+
+    def test_recount_repairs_drift(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=0)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+
+    def test_group_counter_follows_posts(self):
+        first, second = (
+            Group.objects.create(title=slug, slug=slug, description='')
+            for slug in ('first', 'second'))
+        post = Post.objects.create(
+            author=self.author, group=first, text='Пост')
+        Post.objects.create(author=self.author, group=first, text='Пост')
+
+        def counts():
+            return list(Group.objects.order_by('slug').values_list(
+                'posts_count', flat=True))
+
+        self.assertEqual(counts(), [2, 0])
+        post.group = second
+        post.save()
+        self.assertEqual(counts(), [1, 1])
+        post.delete()
+        self.assertEqual(counts(), [1, 0])
+        Group.objects.update(posts_count=7)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(counts(), [1, 0])
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def reply(self, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.author, parent=parent, text='Ответ')
+
+    def descendants(self, comment):
+        comment.refresh_from_db()
+        return comment.descendants_count
+
+    def test_path_depth_and_descendants(self):
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        other = self.reply()
+        self.assertEqual(
+            (root.depth, child.depth, grandchild.depth), (0, 1, 2))
+        self.assertTrue(grandchild.path.startswith(child.path))
+        self.assertEqual(
+            [comment.pk for comment in Comment.objects.branches(
+                root.path, root.path)],
+            [root.pk, child.pk, grandchild.pk])
+        self.assertEqual(
+            (self.descendants(root), self.descendants(child)), (2, 1))
+        self.assertEqual(self.descendants(other), 0)
+        child.delete()
+        self.assertEqual(self.descendants(root), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    @override_settings(COMMENT_MAX_DEPTH=1)
+    def test_replies_below_max_depth_become_siblings(self):
+        root = self.reply()
+        child = self.reply(root)
+        deeper = self.reply(child)
+        self.assertEqual(deeper.parent, root)
+        self.assertEqual(deeper.depth, 1)
+
+    def test_fill_paths_and_recount(self):
+        root = self.reply()
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text='Корень'),
+            Comment(post=self.post, author=self.author, parent=root,
+                    text='Ответ'),
+        ])
+        Comment.objects.filter(pk=root.pk).update(descendants_count=5)
+        call_command('recount', stdout=StringIO())
+        self.assertFalse(Comment.objects.filter(path__isnull=True).exists())
+        reply = Comment.objects.get(parent=root)
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(root.path))
+        self.assertEqual(self.descendants(root), 1)
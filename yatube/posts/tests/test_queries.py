@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='budget',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name=str(i))
+            for i in range(10)
+        ]
+        Post.objects.bulk_create(
+            Post(author=author, group=cls.group, text=f'Пост {i}')
+            for i, author in enumerate(cls.authors)
+        )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feed_query_budget(self):
+        # сессия, пользователь, валидатор условного ответа
+        # и одна выборка постов вместе с авторами
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': 'budget'}): 5,
+            # плюс поиск популярных авторов среди подписок
+            reverse('posts:follow_index'): 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_profile_query_budget(self):
+        author = self.authors[0]
+        Post.objects.bulk_create(
+            Post(author=author, group=self.group, text=f'Ещё пост {i}')
+            for i in range(9)
+        )
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_post_detail_query_budget(self):
+        post = Post.objects.first()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_post_images_query_budget(self):
+        Post.objects.update(image=Concat(
+            Value('posts/'), Cast('pk', CharField()), Value('.gif')))
+        # записи kvstore о миниатюрах всех картинок страницы — одним
+        # запросом
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_not_modified_query_budget(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        # сессия, пользователь и валидатор
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_index_audit_uses_indexes(self):
+        out = StringIO()
+        call_command('index_audit', stdout=out, no_color=True)
+        report = out.getvalue()
+        self.assertIn('post_group_pub_date_idx', report)
+        self.assertIn('post_author_pub_date_idx', report)
+        self.assertIn('comment_post_created_idx', report)
+        self.assertIn('comment_post_root_idx', report)
+        self.assertIn('comment_post_path_idx', report)
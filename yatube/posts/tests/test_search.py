@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.models import Task
+from core.tasks import Worker
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Прогулка по зимнему лесу')
+        cls.other = Post.objects.create(
+            author=cls.author, text='Рецепт <b>борща</b>')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['page_obj'])
+
+    def test_search_by_post_text(self):
+        self.assertEqual(self.search('лес'), [self.post])
+        self.assertEqual(self.search('зимнему ЛЕСУ'), [self.post])
+        self.assertEqual(self.search('пустыня'), [])
+        self.assertEqual(self.search('""*'), [])
+
+    def test_highlight_escapes_text(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'борща'})
+        self.assertContains(response, '<mark>борща</mark>')
+        self.assertNotContains(response, '<b>')
+
+    def test_index_follows_changes(self):
+        comment = Comment.objects.create(
+            post=self.other, author=self.author, text='Добавить свёклу')
+        self.assertEqual(self.search('свёклу'), [self.other])
+        comment.delete()
+        self.assertEqual(self.search('свёклу'), [])
+        post = Post.objects.create(author=self.author, text='Поход в горы')
+        post.text = 'Прогулка по морю'
+        post.save()
+        self.assertEqual(self.search('горы'), [])
+        self.assertEqual(self.search('морю'), [post])
+        post.delete()
+        self.assertEqual(self.search('морю'), [])
+
+    def test_post_text_ranks_above_comments(self):
+        Comment.objects.create(
+            post=self.other, author=self.author, text='Ходили в лес')
+        self.assertEqual(self.search('лес'), [self.post, self.other])
+
+    def test_rebuild_command(self):
+        Post.objects.bulk_create([Post(author=self.author, text='Горы')])
+        self.assertEqual(self.search('горы'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(len(self.search('горы')), 1)
+
+
+@override_settings(TASKS_EAGER=False)
+class SearchQueueTests(TransactionTestCase):
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def run_worker(self):
+        worker = Worker('test')
+        while worker.run_once()[1]:
+            pass
+
+    def test_index_is_updated_by_worker(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Прогулка по лесу')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=author, text=f'Ответ {index}')
+            for index in range(3)
+        ])
+        self.assertEqual(self.search('лесу'), [])
+        self.run_worker()
+        self.assertEqual(self.search('лесу'), [post])
+        # каскадное удаление с комментариями ставит одну задачу
+        post.delete()
+        self.assertEqual(Task.objects.count(), 1)
+        self.run_worker()
+        self.assertEqual(self.search('лесу'), [])
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+from ..timeline import timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    def test_post_fan_out_on_write(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        Post.objects.create(author=self.other, text='Чужой пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+        follow.delete()
+        self.assertFalse(self.reader.timeline.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_read_on_request(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    def test_backfill_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', stdout=open('/dev/null', 'w'))
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_posts_of_former_celebrity_stay_in_feed(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        # подписчиков стало меньше предела: пост раскладывается по лентам
+        follow.delete()
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.assertEqual(list(timeline_posts(self.reader)), [post])
+
+    def test_follow_feed_cursor_pages(self):
+        """Страницы ленты подписок идут курсором по записям ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(13)
+        ]
+        cache.clear()
+        self.client.force_login(self.reader)
+        url = reverse('posts:follow_index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'cursor': first_page.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first_page] + [
+                post.pk for post in second_page],
+            [post.pk for post in reversed(posts)])
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class ImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, name, **options):
+        call_command('export_posts', self.path(name), stdout=StringIO(),
+                     **options)
+        return self.path(name)
+
+    def import_(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_round_trip(self):
+        paths = [self.export(name) for name in ('posts.jsonl', 'posts.csv')]
+        for path in paths:
+            with self.subTest(path=path):
+                before = Post.objects.count()
+                self.import_(path, batch_size=2, chunk_size=2)
+                self.assertEqual(Post.objects.count(), before + 3)
+        copies = Post.objects.filter(text='Пост 0')
+        self.assertEqual(copies.count(), 3)
+        self.assertEqual(
+            len(set(copies.values_list('pub_date', flat=True))), 1)
+        self.assertEqual(
+            set(copies.values_list('group_id', flat=True)), {self.group.pk})
+
+    def test_import_updates_counters_and_timelines(self):
+        self.import_(self.export('posts.jsonl'))
+        self.assertEqual(UserStats.objects.get(
+            user=self.author).posts_count, 6)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 6)
+
+    def test_export_filters(self):
+        path = self.export('posts.jsonl', author='reader')
+        with open(path) as file:
+            self.assertEqual(file.read(), '')
+        path = self.export('posts.jsonl', group='group')
+        with open(path) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['author'], 'author')
+
+    def test_bad_rows_are_skipped(self):
+        path = self.path('bad.jsonl')
+        with open(path, 'w') as file:
+            file.write('не json\n')
+            for record in (
+                {'author': 'nobody', 'text': 'Текст'},
+                {'author': 'author', 'text': ''},
+                {'author': 'author', 'text': 'Текст', 'group': 'nogroup'},
+                {'author': 'author', 'text': 'Текст', 'pub_date': 'вчера'},
+                {'author': 'author', 'text': 'Текст', 'pub_date': 1},
+                {'author': ['author'], 'text': 'Текст'},
+                {'author': 'author', 'text': 'Новый пост'},
+            ):
+                file.write(json.dumps(record) + '\n')
+        out, err = self.import_(path)
+        self.assertIn('пропущено: 7', out)
+        self.assertEqual(len(err.splitlines()), 7)
+        self.assertTrue(Post.objects.filter(text='Новый пост').exists())
+
+    def test_create_missing_authors_and_groups(self):
+        path = self.path('new.jsonl')
+        with open(path, 'w') as file:
+            file.write(json.dumps(
+                {'author': 'newcomer', 'group': 'new', 'text': 'Текст'}))
+        self.import_(path, create_authors=True, create_groups=True)
+        post = Post.objects.get(text='Текст')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(post.group.slug, 'new')
+        self.assertEqual(post.author.stats.posts_count, 1)
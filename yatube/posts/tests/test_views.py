@@ -1,23 +1,22 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-import shutil
-import tempfile
 
-from ..models import Group, Post, Follow
+from . import TempMediaMixin
+from .. import thumbnails
+from ..utils import CursorPaginator
+from ..models import Comment, Group, Post, Follow
 from ..forms import PostForm
 from django.core.cache import cache
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
-
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostViewsTests(TestCase):
+class PostViewsTests(TempMediaMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -49,11 +48,6 @@ class PostViewsTests(TestCase):
             image=uploaded,
         )
 
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
-
     def setUp(self):
         self.guest_client = Client()
         self.authorized_client = Client()
@@ -148,20 +142,31 @@ class PostViewsTests(TestCase):
         self.assertContains(response_profile, self.post.text)
 
     def test_cache_index_page(self):
+        """Карточка поста на главной кешируется и сбрасывается
+        при изменении поста."""
         post = Post.objects.create(
             text='Пост для проверки кеша',
             author=self.user
         )
-        response = self.authorized_client.get(
-            reverse('posts:index')).content
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=post.pk).update(text='Обновлено в обход')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост для проверки кеша')
+        post.text = 'Отредактированный пост'
+        post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Отредактированный пост')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 1')
+        # имя автора входит в ключ карточки
+        self.user.first_name = 'Переименованный'
+        self.user.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Переименованный')
         post.delete()
-        response_delete = self.authorized_client.get(
-            reverse('posts:index')).content
-        self.assertEqual(response, response_delete)
-        cache.clear()
-        response_cache_clear = self.authorized_client.get(
-            reverse('posts:index')).content
-        self.assertNotEqual(response, response_cache_clear)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Отредактированный пост')
 
 
 class PaginatorViewsTest(TestCase):
@@ -184,6 +189,7 @@ class PaginatorViewsTest(TestCase):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_paginator(self):
         first_page = 10
@@ -202,6 +208,38 @@ class PaginatorViewsTest(TestCase):
                     pages + '?page=2').context.get('page_obj')),
                     second_page)
 
+    def test_cursor_paginator(self):
+        """Курсоры ведут на соседние страницы без OFFSET и COUNT."""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            second_page = self.client.get(
+                url, {'cursor': first_page.paginator.next_cursor}
+            ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertEqual(second_page.number, 2)
+        self.assertFalse(second_page.has_next())
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('COUNT(', query['sql'])
+                self.assertNotIn('OFFSET', query['sql'])
+        ids = {post.pk for post in first_page} | {
+            post.pk for post in second_page}
+        self.assertEqual(len(ids), 13)
+        back_page = self.client.get(
+            url, {'cursor': second_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in back_page],
+            [post.pk for post in first_page]
+        )
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -265,3 +303,340 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+
+class ThumbnailTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertContains(self.client.get(url), 'Изображение обрабатывается')
+        self.assertTrue(
+            thumbnails.build_for_post(self.post.pk, self.post.image))
+        thumbnail = thumbnails.ready_thumbnail(self.post.image, '960x339')
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, thumbnail.url)
+
+
+class ConditionalResponseTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+
+    def etags(self, client=None):
+        client = client or self.client
+        return [client.get(url)['ETag'] for url in self.urls]
+
+    def assert_not_modified(self, etags, expected):
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, 304 if expected else 200)
+
+    def test_not_modified_until_changes(self):
+        etags = self.etags()
+        self.assert_not_modified(etags, True)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assert_not_modified(etags, False)
+        etags = self.etags()
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        self.assert_not_modified(etags, False)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.urls[0])
+        response = self.client.get(
+            self.urls[0], HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        client = Client()
+        client.force_login(self.author)
+        self.assertNotEqual(self.etags(), self.etags(client))
+
+
+@override_settings(COUNT_POSTS=2)
+class PageWindowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        for number in range(40):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        paginator = CursorPaginator(Post.objects.all(), 2, count=40)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(10)),
+            [1, '…', 8, 9, 10, 11, 12, '…', 20])
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, '…', 20])
+        paginator = CursorPaginator(Post.objects.all(), 2, count=8)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)), [1, 2, 3, 4])
+
+    def test_window_without_count_query(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                # Общее число постов считается один раз и живёт в кеше
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url + '?page=10')
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries
+                    if 'posts_post' in query['sql']))
+                page = response.context['page_obj']
+                self.assertEqual(page.number, 10)
+                self.assertEqual(page.paginator.total_pages, 20)
+                self.assertEqual(
+                    response.content.decode().count('class="page-item'), 11)
+                self.assertContains(response, f'href="{url}?page=8"')
+
+
+@override_settings(COUNT_POSTS=10)
+class LastPageTests(TestCase):
+    """Страницы по курсору совпадают со страницами ?page=N."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {number}')
+            for number in range(25))
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+
+    def page(self, **params):
+        return self.client.get(self.url, params).context['page_obj']
+
+    def rows(self, page):
+        return [post.pk for post in page]
+
+    def test_walk_back_from_last_page(self):
+        links = dict(self.page().paginator.page_links())
+        page = self.page(cursor=links[3][len('?cursor='):])
+        numbers = []
+        while True:
+            numbers.append(page.number)
+            with self.subTest(number=page.number):
+                self.assertEqual(
+                    self.rows(page), self.rows(self.page(page=page.number)))
+            if not page.has_previous():
+                break
+            page = self.page(cursor=page.paginator.previous_cursor)
+        self.assertEqual(numbers, [3, 2, 1])
+        self.assertEqual(len(self.rows(self.page(page=3))), 5)
+
+    def test_page_past_the_end_is_last_page(self):
+        page = self.page(page=99)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(self.rows(page), self.rows(self.page(page=3)))
+
+    def test_links_serve_their_numbers(self):
+        for current in (1, 2, 3):
+            response = self.client.get(self.url, {'page': current})
+            for number, query in response.context[
+                    'page_obj'].paginator.page_links():
+                if not query:
+                    continue
+                with self.subTest(current=current, number=number):
+                    self.assertContains(
+                        response, f'href="{self.url}{query}"')
+                    page = self.client.get(
+                        self.url + query).context['page_obj']
+                    self.assertEqual(page.number, number)
+                    self.assertEqual(
+                        self.rows(page), self.rows(self.page(page=number)))
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Комментарий {i}')
+            for i in range(25))
+        Comment.objects.fill_paths()
+        Post.objects.filter(pk=cls.post.pk).update(comments_count=25)
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk})
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def next_query(self, response):
+        page = response.context['comments_page']
+        order = response.context['comments_order']
+        return f'?order={order}&cursor={page.paginator.next_cursor}'
+
+    def test_batches_oldest_first(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(
+            self.texts(response), [f'Комментарий {i}' for i in range(10)])
+        self.assertContains(
+            response, f'data-fragment="{self.fragment_url}?order=oldest')
+        seen = self.texts(response)
+        # валидатор, пост, корни страницы и их ветки с авторами
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                self.fragment_url + self.next_query(response))
+        self.assertTemplateUsed(response, 'posts/includes/comments_list.html')
+        self.assertNotContains(response, '<html')
+        seen += self.texts(response)
+        response = self.client.get(
+            self.fragment_url + self.next_query(response))
+        seen += self.texts(response)
+        self.assertEqual(seen, [f'Комментарий {i}' for i in range(25)])
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_newest_first(self):
+        response = self.client.get(self.detail_url + '?order=newest')
+        self.assertEqual(
+            self.texts(response),
+            [f'Комментарий {i}' for i in range(24, 14, -1)])
+        response = self.client.get(
+            self.detail_url + self.next_query(response))
+        self.assertEqual(
+            self.texts(response),
+            [f'Комментарий {i}' for i in range(14, 4, -1)])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.fragment_url + '?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk + 1}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_PER_PAGE=2, COMMENT_THREAD_DEPTH=2)
+class CommentThreadViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.roots = [cls.comment(f'Корень {i}') for i in range(3)]
+        parent = cls.roots[0]
+        cls.chain = []
+        for depth in range(1, 5):
+            parent = cls.comment(f'Уровень {depth}', parent)
+            cls.chain.append(parent)
+        cls.comment('Ответ на второй', cls.roots[1])
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk})
+
+    @classmethod
+    def comment(cls, text, parent=None):
+        return Comment.objects.create(
+            post=cls.post, author=cls.author, parent=parent, text=text)
+
+    def texts(self, response):
+        return [comment.text for comment in response.context['comments']]
+
+    def test_page_of_branches(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url)
+        comment_queries = [
+            query for query in queries if 'posts_comment' in query['sql']]
+        # валидатор, корни страницы и одна выборка их веток
+        self.assertEqual(len(comment_queries), 3)
+        self.assertEqual(self.texts(response), [
+            'Корень 0', 'Уровень 1', 'Уровень 2',
+            'Корень 1', 'Ответ на второй'])
+        level = response.context['comments'][2]
+        self.assertEqual((level.indent, level.collapsed), (2, 2))
+        self.assertContains(response, 'Ещё ответов: 2')
+        response = self.client.get(self.detail_url + '?order=newest')
+        self.assertEqual(self.texts(response), [
+            'Корень 2', 'Корень 1', 'Ответ на второй'])
+
+    def test_collapsed_branch(self):
+        level = self.chain[1]
+        response = self.client.get(
+            self.fragment_url + f'?thread={level.pk}&base=0')
+        self.assertEqual(self.texts(response), ['Уровень 3', 'Уровень 4'])
+        self.assertEqual(
+            [comment.indent for comment in response.context['comments']],
+            [3, 4])
+        response = self.client.get(self.detail_url + f'?thread={level.pk}')
+        self.assertEqual(
+            self.texts(response), ['Уровень 2', 'Уровень 3', 'Уровень 4'])
+        self.assertContains(response, 'Все комментарии')
+        response = self.client.get(self.detail_url + '?thread=0')
+        self.assertEqual(response.status_code, 404)
+
+    def test_reply(self):
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(
+            self.detail_url + f'?reply={self.roots[2].pk}')
+        self.assertContains(
+            response, f'name="parent" value="{self.roots[2].pk}"')
+        client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Новый ответ', 'parent': self.roots[2].pk})
+        reply = Comment.objects.get(text='Новый ответ')
+        self.assertEqual((reply.parent, reply.depth), (self.roots[2], 1))
@@ -0,0 +1,155 @@
+"""Заблаговременная генерация миниатюр для Post.image.
+
+Миниатюры всех размеров из THUMBNAIL_GEOMETRIES строит воркер очереди
+задач (core/tasks.py) после сохранения поста, поэтому запрос страницы
+не платит за декодирование и масштабирование картинки. Пока миниатюра
+не готова, шаблон показывает заглушку.
+"""
+import hashlib
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.tasks import task
+
+from .cache import invalidate_post
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Заглушка в шаблоне ставит задачу не чаще раза в столько секунд
+SCHEDULE_TIMEOUT = 60 * 10
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает миниатюру, только если она уже построена."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, options))
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры с теми же именем и ключом kvstore, что у
+        get_thumbnail(), без чтения картинки."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+backend = ReadyThumbnailBackend()
+
+
+def ready_thumbnail(image, geometry):
+    if not image:
+        return None
+    return backend.get_ready_thumbnail(
+        image, geometry, **settings.THUMBNAIL_GEOMETRIES[geometry])
+
+
+def prefetch(posts):
+    """Читает из kvstore записи о миниатюрах картинок страницы одним
+    запросом и кладёт их в кеш, откуда ready_thumbnail() их и возьмёт.
+    Иначе при холодном кеше каждая картинка — отдельный запрос к базе.
+    Работает с kvstore sorl по умолчанию (cached_db)."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return
+    keys = {
+        add_prefix(backend.thumbnail_file(
+            post.image, geometry, dict(options)).key)
+        for post in posts if post.image
+        for geometry, options in settings.THUMBNAIL_GEOMETRIES.items()
+    }
+    missing = keys - set(kvstore.cache.get_many(keys))
+    if not missing:
+        return
+    found = dict(KVStoreModel.objects.filter(
+        key__in=missing).values_list('key', 'value'))
+    # как и kvstore, запоминаем и отсутствие записи
+    empty = cached_db_kvstore.EMPTY_VALUE
+    kvstore.cache.set_many(
+        {key: found.get(key, empty) for key in missing},
+        sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+
+def thumbnail_size(post, geometry):
+    """Размер миниатюры по записанным размерам оригинала, без чтения
+    файла; None, если он неизвестен."""
+    width, height = (int(side) for side in geometry.split('x'))
+    options = settings.THUMBNAIL_GEOMETRIES[geometry]
+    if options.get('crop'):
+        return width, height
+    if not (post.image_width and post.image_height):
+        return None, None
+    scale = min(width / post.image_width, height / post.image_height)
+    if scale > 1 and not options.get('upscale', True):
+        scale = 1
+    return (round(post.image_width * scale),
+            round(post.image_height * scale))
+
+
+def generate(image):
+    """Строит все миниатюры картинки; уже готовые берутся из kvstore."""
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.items():
+        get_thumbnail(image, geometry, **options)
+
+
+def build_for_post(post_id, image):
+    """Строит миниатюры поста; возвращает False при ошибке."""
+    try:
+        generate(image)
+        # карточка на главной могла закешироваться с заглушкой
+        invalidate_post(post_id)
+        return True
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', image)
+        return False
+
+
+@task(priority=10, batch_size=20)
+def build(items):
+    """Задача очереди: миниатюры пачки постов."""
+    posts = Post.objects.filter(
+        pk__in={item['post_id'] for item in items},
+    ).exclude(image='').only('pk', 'image')
+    failed = [
+        post.pk for post in posts
+        if not build_for_post(post.pk, post.image)
+    ]
+    if failed:
+        raise RuntimeError(f'Миниатюры постов {failed} не построены')
+
+
+def schedule_key(image):
+    return 'thumbnails:scheduled:' + hashlib.md5(
+        image.name.encode()).hexdigest()
+
+
+def schedule(post):
+    """Ставит построение миниатюр поста в очередь задач после
+    фиксации транзакции, когда файл картинки уже сохранён. Шаблон
+    вызывает её при каждом показе заглушки, поэтому одна картинка
+    ставится не чаще раза в SCHEDULE_TIMEOUT."""
+    image = post.image
+    if not image or not image.storage.exists(image.name):
+        return
+    if cache.add(schedule_key(image), True, SCHEDULE_TIMEOUT):
+        transaction.on_commit(partial(build.delay, post_id=post.pk))
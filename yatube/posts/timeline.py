@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .bulk import chunks
+from .models import Follow, Post, TimelineEntry, UserStats
+
+# Порядок ленты подписок для get_paginator(): по колонкам записей
+# ленты, чтобы страница читалась диапазоном индекса
+# (user, -pub_date, -post), а не сортировкой всех постов читателя
+TIMELINE_ORDERING = ('-feed_date', '-feed_id')
+
+
+def celebrity_ids(authors):
+    """Авторы, чьи посты не раскладываются по лентам подписчиков,
+    а читаются напрямую при открытии ленты."""
+    return list(
+        UserStats.objects.filter(
+            user__in=authors, celebrity=True,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if celebrity_ids([post.author_id]):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+FAN_OUT_SQL = """
+{insert} {entries} (user_id, post_id, pub_date)
+SELECT follow.user_id, post.id, post.pub_date
+FROM {posts} post
+JOIN {follows} follow ON follow.author_id = post.author_id
+WHERE {where} AND post.author_id NOT IN (
+    SELECT user_id FROM {stats} WHERE celebrity = %s
+)
+{suffix}
+"""
+
+
+def fan_out_where(where, params):
+    """Раскладывает по лентам посты, подходящие под условие ``where``
+    для таблицы ``post``, одним INSERT ... SELECT."""
+    sql = FAN_OUT_SQL.format(
+        insert=connection.ops.insert_statement(ignore_conflicts=True),
+        entries=TimelineEntry._meta.db_table,
+        posts=Post._meta.db_table,
+        follows=Follow._meta.db_table,
+        stats=UserStats._meta.db_table,
+        where=where,
+        suffix=connection.ops.ignore_conflicts_suffix_sql(
+            ignore_conflicts=True),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, True])
+        return cursor.rowcount
+
+
+def fan_out_posts(post_ids):
+    """Раскладывает по лентам посты, записанные в обход сигналов."""
+    for part in chunks(post_ids, 500):
+        fan_out_where(
+            f'post.id IN ({", ".join(["%s"] * len(part))})', part)
+
+
+def follower_added(author_id):
+    """Отмечает автора популярным, когда подписчиков стало
+    TIMELINE_FANOUT_LIMIT. Разложенные раньше записи остаются."""
+    UserStats.objects.filter(
+        user_id=author_id, celebrity=False,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(celebrity=True)
+
+
+def follower_removed(author_id):
+    """Снимает отметку, когда подписчиков стало меньше предела, и
+    раскладывает посты, написанные, пока автор был популярным: иначе
+    они пропали бы из лент подписчиков."""
+    demoted = UserStats.objects.filter(
+        user_id=author_id, celebrity=True,
+        followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(celebrity=False)
+    if demoted:
+        fan_out_where('post.author_id = %s', [author_id])
+
+
+def add_author(user_id, author_id):
+    """Переносит в ленту посты автора, на которого подписались."""
+    if celebrity_ids([author_id]):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Лента подписок: разложенные записи плюс посты популярных
+    авторов, которые читаются при запросе. Сортируется по
+    TIMELINE_ORDERING."""
+    celebrities = celebrity_ids(
+        Follow.objects.filter(user=user).values('author'))
+    posts = Post.objects.for_feed()
+    if not celebrities:
+        posts = posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post'),
+        )
+    else:
+        entries = TimelineEntry.objects.filter(user=user).values('post')
+        posts = posts.filter(
+            Q(pk__in=entries) | Q(author_id__in=celebrities)
+        ).annotate(feed_date=F('pub_date'), feed_id=F('pk'))
+    return posts.order_by(*TIMELINE_ORDERING)
+
+
+def rebuild(batch_size=None):
+    """Заново отмечает популярных авторов и раскладывает все посты по
+    лентам подписчиков."""
+    batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    UserStats.objects.filter(followers_count__gte=limit).update(
+        celebrity=True)
+    UserStats.objects.filter(followers_count__lt=limit).update(
+        celebrity=False)
+    TimelineEntry.objects.all().delete()
+    celebrities = set(celebrity_ids(Follow.objects.values('author')))
+    follows = Follow.objects.exclude(
+        author_id__in=celebrities).values_list('user_id', 'author_id')
+    created = 0
+    for user_id, author_id in follows.iterator():
+        posts = Post.objects.filter(
+            author_id=author_id).values_list('pk', 'pub_date')
+        entries = [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ]
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=batch_size, ignore_conflicts=True)
+        created += len(entries)
+    return created
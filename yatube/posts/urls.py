@@ -1,6 +1,9 @@
-from django.urls import path
+from django.urls import path, register_converter
 
 from . import views
+from .feeds import FormatConverter
+
+register_converter(FormatConverter, 'feed')
 
 app_name = 'posts'
 
@@ -9,6 +12,25 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('live/', views.index_live, name='index_live'),
+    path('group/<slug:slug>/live/', views.group_live, name='group_live'),
+    path('follow/live/', views.follow_live, name='follow_live'),
+    path('feed/<feed:kind>/', views.index_feed, name='index_feed'),
+    path(
+        'group/<slug:slug>/feed/<feed:kind>/',
+        views.group_feed,
+        name='group_feed'
+    ),
+    path(
+        'profile/<str:username>/feed/<feed:kind>/',
+        views.profile_feed,
+        name='profile_feed'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -17,6 +39,7 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search_posts, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
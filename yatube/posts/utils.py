@@ -1,9 +1,286 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import json
+import math
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинатор по паре полей, например ``(-pub_date, -id)``,
+    или по одному уникальному полю. Поля могут быть аннотациями
+    queryset.
+
+    Соседние страницы выбираются условием ``WHERE (pub_date, id) < (...)``
+    по значениям крайней записи текущей страницы, поэтому стоимость
+    страницы не зависит от её глубины. Номера страниц ``?page=N``
+    по-прежнему обслуживаются через OFFSET для старых ссылок.
+
+    Экземпляр обслуживает одну страницу за запрос: после выборки он
+    знает, есть ли соседние страницы, и отдаёт курсоры на них.
+
+    Если число записей известно заранее (счётчики группы, автора или
+    всех постов), его передают в ``count`` числом или функцией, которая
+    вызывается, только когда число понадобится; COUNT(*) тогда не
+    выполняется.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 count=None, **kwargs):
+        self.known_count = count
+        self.ordering = tuple(ordering)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+        self.page_obj = None
+        super().__init__(object_list.order_by(*self.ordering), per_page,
+                         **kwargs)
+
+    @cached_property
+    def count(self):
+        """Переданное число записей или приблизительное, кешируемое на
+        ``PAGINATOR_COUNT_TIMEOUT`` секунд."""
+        if self.known_count is not None:
+            if callable(self.known_count):
+                return self.known_count()
+            return self.known_count
+        try:
+            sql = str(self.object_list.query)
+        except EmptyResultSet:
+            return 0
+        key = 'paginator:count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    @property
+    def total_pages(self):
+        """Число страниц по счётчику, но не меньше уже известного."""
+        pages = math.ceil(self.count / self.per_page)
+        page = self.page_obj
+        if page is not None:
+            pages = max(pages, page.number + page.has_next())
+        return max(pages, 1)
+
+    def get_elided_page_range(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+        Как Paginator.get_elided_page_range() из Django 3.2, но число
+        элементов не зависит от числа страниц."""
+        last = self.total_pages
+        if last <= (on_each_side + on_ends) * 2 + 1:
+            yield from range(1, last + 1)
+            return
+        start = max(number - on_each_side, 1)
+        end = min(number + on_each_side, last)
+        if start > on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(start, number)
+        else:
+            yield from range(1, number)
+        if end < last - on_ends:
+            yield from range(number, end + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(number, last + 1)
+
+    def page_links(self):
+        """Окно ссылок для паджинатора: (номер, строка запроса).
+        Соседние, первая и последняя страницы открываются курсором,
+        остальные — старыми ссылками ?page=N. Страницы по курсору
+        выровнены по тем же границам, что и ?page=N: последняя
+        начинается с записи (N - 1) * per_page."""
+        page = self.page_obj
+        last = self.total_pages
+        queries = {1: '', last: f'?cursor={self.last_cursor}'}
+        if page.has_previous():
+            queries[page.number - 1] = f'?cursor={self.previous_cursor}'
+        if page.has_next():
+            queries[page.number + 1] = f'?cursor={self.next_cursor}'
+        queries[page.number] = None
+        for number in self.get_elided_page_range(page.number):
+            if number == self.ELLIPSIS:
+                yield number, None
+            else:
+                yield number, queries.get(number, f'?page={number}')
+
+    @property
+    def show_total(self):
+        return settings.PAGINATOR_SHOW_TOTAL
+
+    @property
+    def next_cursor(self):
+        page = self.page_obj
+        if page is None or not page.object_list or not page.has_next():
+            return None
+        return self.encode_cursor(
+            FORWARD, page.number + 1, page.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        page = self.page_obj
+        if page is None or not page.object_list or not page.has_previous():
+            return None
+        return self.encode_cursor(
+            BACKWARD, page.number - 1, page.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return self.encode_cursor(BACKWARD, None, None)
+
+    def _get_page(self, object_list, number, paginator):
+        self.page_obj = super()._get_page(list(object_list), number, paginator)
+        return self.page_obj
+
+    def get_page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if number <= 1:
+            return self.first_page()
+        return self.number_page(number)
+
+    def first_page(self):
+        return self._seek_page(FORWARD, 1, None)
+
+    def last_page(self):
+        """Последняя страница с конца списка, без OFFSET. В ней
+        ``count - (N - 1) * per_page`` записей, как у ?page=N, а не
+        последние per_page: иначе она пересекалась бы с предыдущей."""
+        number = max(math.ceil(self.count / self.per_page), 1)
+        if number == 1:
+            return self.first_page()
+        size = self.count - (number - 1) * self.per_page
+        items = list(self.object_list.reverse()[:size])
+        items.reverse()
+        self.num_pages = number
+        return self._get_page(items, number, self)
+
+    def number_page(self, number):
+        """Страница ?page=N через OFFSET, но без COUNT(*): есть ли
+        следующая, видно по лишней записи. Номер за концом списка
+        открывает последнюю страницу."""
+        offset = (number - 1) * self.per_page
+        items = list(self.object_list[offset:offset + self.per_page + 1])
+        if not items:
+            return self.last_page()
+        self.num_pages = number + 1 if len(items) > self.per_page else number
+        return self._get_page(items[:self.per_page], number, self)
+
+    def cursor_page(self, cursor):
+        direction, number, values = self.decode_cursor(cursor)
+        if values is None:
+            return self.last_page() if direction == BACKWARD else (
+                self.first_page())
+        return self._seek_page(direction, number, values)
+
+    def encode_cursor(self, direction, number, obj):
+        values = None
+        if obj is not None:
+            values = [self._value(obj, name) for name in self.fields]
+            values = [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in values
+            ]
+        data = json.dumps([direction, number, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, number, values = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            if direction not in (FORWARD, BACKWARD):
+                raise ValueError(direction)
+            if number is not None:
+                number = max(int(number), 1)
+            if values is not None:
+                if len(values) != len(self.fields):
+                    raise ValueError(values)
+                values = [
+                    self.field(name).to_python(value)
+                    for name, value in zip(self.fields, values)
+                ]
+                if None in values:
+                    raise ValueError(values)
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+        return direction, number, values
+
+    def field(self, name):
+        """Поле сортировки: поле модели или аннотация queryset."""
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    @staticmethod
+    def _value(obj, name):
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+    def _seek_page(self, direction, number, values):
+        forward = direction == FORWARD
+        queryset = self.object_list
+        if not forward:
+            queryset = queryset.reverse()
+        if values is not None:
+            lookup = 'lt' if self.descending == forward else 'gt'
+            first, first_value = self.fields[0], values[0]
+            condition = Q(**{f'{first}__{lookup}': first_value})
+            if len(self.fields) > 1:
+                second, second_value = self.fields[1], values[1]
+                condition |= Q(**{first: first_value,
+                                  f'{second}__{lookup}': second_value})
+            queryset = queryset.filter(condition)
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if forward:
+            has_next = has_more
+            if values is not None:
+                number = max(number or 2, 2)
+        else:
+            if not has_more and len(items) < self.per_page:
+                # дошли до начала неполной страницей (после удалений
+                # или новых постов): первая страница — та же, что ?page=1
+                return self.first_page()
+            items.reverse()
+            has_next = values is not None
+            number = max(number or 2, 2) if has_more else 1
+        # Номер страницы известен из курсора, а число страниц задаём
+        # так, чтобы Page.has_next() не требовал COUNT(*).
+        self.num_pages = number + 1 if has_next else number
+        return self._get_page(items, number, self)
 
 
-def get_paginator(queryset, request):
-    paginator = Paginator(queryset, settings.COUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def get_paginator(queryset, request, ordering=('-pub_date', '-id'),
+                  count=None):
+    paginator = CursorPaginator(
+        queryset, settings.COUNT_POSTS, ordering, count=count)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            return paginator.cursor_page(cursor)
+        except InvalidCursor:
+            pass
+    return paginator.get_page(request.GET.get('page'))
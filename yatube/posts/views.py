@@ -1,26 +1,37 @@
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, User, Follow
+from django.urls import reverse
+from .models import Comment, Post, Group, User, Follow, UserStats
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
+from . import search, thumbnails
+from .comments import get_comments
+from .cache import posts_count
+from .feeds import cached, feed_response
+from .live import live_response
+from .conditional import (conditional, group_validator, index_validator,
+                          post_validator, profile_validator)
+from .timeline import TIMELINE_ORDERING, timeline_posts
 from .utils import get_paginator
-from django.views.decorators.cache import cache_page
 
 
-@cache_page(20)
+@conditional(index_validator)
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
-    pagin = get_paginator(post_list, request)
+    post_list = Post.objects.for_feed()
+    pagin = get_paginator(post_list, request, count=posts_count)
     context = {
         'page_obj': pagin,
+        'card_cache_timeout': settings.POST_CARD_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_validator)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.all().filter(
-        group=group).order_by('-pub_date')
-    pagin = get_paginator(posts, request)
+    posts = Post.objects.for_feed().filter(group=group)
+    pagin = get_paginator(posts, request, count=group.posts_count)
     context = {
         'page_obj': pagin,
         'group': group,
@@ -28,45 +39,131 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_validator)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()  # type: ignore
-    pagin = get_paginator(posts, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    posts = author.posts.for_feed()  # type: ignore
+    author_stats = UserStats.get_for(author)
+    pagin = get_paginator(posts, request, count=author_stats.posts_count)
     context = {
         'author': author,
+        'author_stats': author_stats,
         'posts': posts,
         'page_obj': pagin,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def index_live(request):
+    return live_response(request, ['index'], Post.objects.all())
+
+
+def group_live(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return live_response(
+        request, [f'group:{group.pk}'], Post.objects.filter(group=group))
+
+
+@login_required
+def follow_live(request):
+    authors = Follow.objects.filter(user=request.user).values_list(
+        'author_id', flat=True)
+    return live_response(
+        request, [f'author:{author}' for author in authors],
+        timeline_posts(request.user))
+
+
+@conditional(index_validator, public=True)
+@cached
+def index_feed(request, kind):
+    return feed_response(
+        request, kind, Post.objects.for_feed(),
+        title='Yatube: последние обновления',
+        link=reverse('posts:index'),
+        description='Новые записи на сайте Yatube',
+    )
+
+
+@conditional(group_validator, public=True)
+@cached
+def group_feed(request, slug, kind):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, kind, Post.objects.for_feed().filter(group=group),
+        title=f'Yatube: {group.title}',
+        link=reverse('posts:group_list', args=[slug]),
+        description=group.description,
+    )
+
+
+@conditional(profile_validator, public=True)
+@cached
+def profile_feed(request, username, kind):
+    author = get_object_or_404(User, username=username)
+    name = author.get_full_name() or author.username
+    return feed_response(
+        request, kind, Post.objects.for_feed().filter(author=author),
+        title=f'Yatube: {name}',
+        link=reverse('posts:profile', args=[username]),
+        description=f'Записи пользователя {name}',
+    )
+
+
+@conditional(post_validator)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     pub_date = post.pub_date
     post_title = post.text[:30]
     author = post.author
-    author_posts = author.posts.all().count()
-    comments = post.comments.all()
+    author_posts = UserStats.get_for(author).posts_count
     form = CommentForm()
+    comments = get_comments(post, request)
+    reply = request.GET.get('reply', '')
+    reply_to = None
+    if reply.isdigit():
+        # обычно отвечают на комментарий с этой же страницы
+        reply_to = next((
+            comment for comment in comments['comments']
+            if comment.pk == int(reply)
+        ), None) or post.comments.select_related('author').filter(
+            pk=reply).first()
     context = {
         'post': post,
         'post_title': post_title,
         'author': author,
         'author_posts': author_posts,
         'pub_date': pub_date,
-        'comments': comments,
         'form': form,
+        'reply_to': reply_to,
+        **comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional(post_validator)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё» или
+    свёрнутая ветка: только разметка комментариев и ссылки за
+    продолжением."""
+    post = get_object_or_404(
+        Post.objects.only('pk', 'comments_count'), pk=post_id)
+    context = {
+        'post': post,
+        **get_comments(post, request, fragment=True),
+    }
+    return render(request, 'posts/includes/comments_list.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', request.user)
     form = PostForm()
     context = {
@@ -88,7 +185,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect(
             'posts:post_detail', post_id
         )
@@ -108,6 +207,10 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = get_object_or_404(Post, pk=post_id)
+        parent = request.POST.get('parent', '')
+        if parent.isdigit():
+            comment.parent = Comment.objects.filter(
+                post=comment.post, pk=parent).first()
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -115,8 +218,8 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    pagin = get_paginator(posts, request)
+    posts = timeline_posts(request.user)
+    pagin = get_paginator(posts, request, TIMELINE_ORDERING)
     context = {
         'page_obj': pagin
     }
@@ -140,3 +243,13 @@ def profile_unfollow(request, username):
     )
     user_follower.delete()
     return redirect('posts:profile', username)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search.search(query), settings.COUNT_POSTS)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
@@ -16,6 +16,83 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 COUNT_POSTS = 10
+# Время жизни приблизительного числа записей в паджинаторе, секунды
+PAGINATOR_COUNT_TIMEOUT = 60
+PAGINATOR_SHOW_TOTAL = True
+# Посты авторов с таким числом подписчиков не раскладываются
+# по лентам, а читаются при открытии ленты подписок
+TIMELINE_FANOUT_LIMIT = 1000
+# Ключ карточки поста на главной меняется с версией поста, автором
+# и группой, поэтому её можно держать в кеше долго
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Размеры миниатюр, которые строятся заранее при загрузке картинки
+THUMBNAIL_GEOMETRIES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+# Фоновые задачи (core/tasks.py, manage.py run_worker): попытки, пауза
+# перед первым повтором и наибольшая пауза, аренда задачи воркером и
+# опрос пустой очереди, секунды. TASKS_EAGER — выполнять задачи сразу
+# при delay(), без воркера (так в yatube/test_settings.py)
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_RETRY_MAX_DELAY = 60 * 60
+TASK_LEASE = 5 * 60
+TASK_POLL_INTERVAL = 1
+# Обработка загружаемых картинок: наибольший размер, формат и качество
+IMAGE_UPLOAD_MAX_SIZE = (1920, 1920)
+IMAGE_UPLOAD_FORMAT = 'WEBP'
+IMAGE_UPLOAD_FALLBACK_FORMAT = 'JPEG'
+IMAGE_UPLOAD_QUALITY = 80
+TIMELINE_BATCH_SIZE = 500
+# Ленты Atom/RSS: сколько последних постов отдавать и сколько хранить
+# готовое тело; ключ кеша меняется с каждым новым постом
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# «N новых записей» на открытых лентах (posts/live.py): heartbeat и
+# наибольшая длительность потока SSE, ожидание long-poll, секунды;
+# пауза перед переподключением браузера, мс; предел счётчика
+LIVE_HEARTBEAT = 15
+LIVE_MAX_SECONDS = 300
+LIVE_POLL_TIMEOUT = 25
+LIVE_RETRY_MS = 5000
+LIVE_MAX_COUNT = 99
+# ASGI (yatube/asgi.py, core/asgi.py): потоки для синхронного кода и
+# view, которые под ASGI работают в цикле событий, без потока на клиента
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 8))
+ASGI_VIEWS = {
+    'posts:index_live': 'posts.async_views.index_live',
+    'posts:group_live': 'posts.async_views.group_live',
+    'posts:follow_live': 'posts.async_views.follow_live',
+}
+# Комментарии под постом: размер порции на странице поста и во
+# фрагменте «Показать ещё»
+COMMENTS_PER_PAGE = 20
+# Ответы на комментарии: наибольшая глубина дерева (ответ глубже
+# становится соседом) и сколько уровней ветки показывать сразу,
+# остальное сворачивается в «ещё N ответов»
+COMMENT_MAX_DEPTH = 8
+COMMENT_THREAD_DEPTH = 3
+# Размер страницы JSON API по умолчанию и наибольший ?limit=
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# Сколько секунд помнить результат проверки пароля HTTP Basic
+API_AUTH_CACHE_TIMEOUT = 60
+# Замеры запросов (core.middleware.instrumentation): сколько последних
+# запросов хранить на каждый URL и бюджеты view. Бюджеты проверяются
+# в тестах (yatube/test_settings.py). Запас в один запрос на промах
+# kvstore миниатюр при холодном кеше
+INSTRUMENTATION_SAMPLES = 1000
+INSTRUMENTATION_ENFORCE_BUDGETS = False
+VIEW_BUDGETS = {
+    'posts:index': {'queries': 5},
+    'posts:group_list': {'queries': 6},
+    'posts:profile': {'queries': 6},
+    'posts:post_detail': {'queries': 7},
+    'posts:post_comments': {'queries': 5},
+    'posts:follow_index': {'queries': 5},
+    'posts:search': {'queries': 6},
+}
 
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
@@ -43,6 +120,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -53,8 +131,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.replicas.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -65,12 +145,29 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Без явных loaders Django 2.2 при DEBUG=True заново читает и разбирает
+# base.html и все include на каждый запрос. Разобранные шаблоны
+# хранятся в процессе (cached.Loader), а шапка и подвал ещё и
+# рендерятся один раз на вариант ({% prerendered %}, core/prerender.py).
+# YATUBE_TEMPLATE_RELOAD=1 — разбор и рендеринг на каждый запрос, чтобы
+# правки шаблонов были видны без перезапуска
+TEMPLATE_RELOAD = os.environ.get('YATUBE_TEMPLATE_RELOAD') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Сюда manage.py prerender_templates собирает варианты шапки и подвала
+PRERENDERED_FRAGMENTS = os.path.join(BASE_DIR, 'prerendered.json')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': (
+            'core.template_backends.instrumented.InstrumentedDjangoTemplates'
+        ),
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS if TEMPLATE_RELOAD else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -88,13 +185,62 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.db.backends.sqlite3 — стандартный бэкенд SQLite с PRAGMA при
+# подключении и очередью на запись внутри процесса: её берут запросы
+# записи, а пишущие транзакции начинаются с BEGIN IMMEDIATE (описание
+# ключей OPTIONS в модуле бэкенда)
+SQLITE_OPTIONS = {
+    'timeout': 20,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -64 * 2 ** 10,
+    'temp_store': 'MEMORY',
+    'transaction_mode': 'IMMEDIATE',
+    'serialize_writes': True,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Реплики только для чтения (core/db/routers.py): алиасы из DATABASES.
+# YATUBE_SQLITE_REPLICAS=N подключает вместо них N раз тот же файл
+# SQLite в режиме только для чтения, чтобы проверить маршрутизацию
+# локально
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+for number in range(1, int(os.environ.get('YATUBE_SQLITE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'file:{}?mode=ro'.format(DATABASES['default']['NAME']),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+# С реплик читают только эти приложения и только эти view
+REPLICA_APPS = ['posts', 'auth']
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+    'posts:index_feed',
+    'posts:group_feed',
+    'posts:profile_feed',
+]
+# После записи клиент столько секунд читает с основной базы
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = 'primary_until'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,8 +284,10 @@ LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
-#  подключаем движок filebased.EmailBackend
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# письма отправляет воркер очереди задач (core/mail.py) через
+# движок filebased.EmailBackend
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+TASK_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -148,8 +296,14 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех процессов кеш в файле SQLite (core/cache/sqlite.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 2 ** 20,
+        },
     }
 }
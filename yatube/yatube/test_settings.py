@@ -0,0 +1,27 @@
+"""Настройки для тестов. Их выбирают manage.py test и pytest
+(pytest.ini, DJANGO_SETTINGS_MODULE в CI)."""
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+# Воркера очереди под тестами нет: задачи выполняются сразу при delay()
+TASKS_EAGER = True
+# View, превысившие бюджет VIEW_BUDGETS, роняют тест
+INSTRUMENTATION_ENFORCE_BUDGETS = True
+# Синхронный код ASGI выполняется прямо в цикле событий: поток пула не
+# видит данных из транзакции теста
+ASGI_THREADS = 0
+# Свой кеш у каждого процесса тестов: файл cache.sqlite3 принадлежит
+# серверу разработки, а тесты очищают кеш и запускаются параллельно
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+# Загруженные тестами файлы не попадают в media/ проекта; классы с
+# картинками берут ещё и свой каталог (posts.tests.TempMediaMixin)
+MEDIA_ROOT = tempfile.mkdtemp(prefix='yatube-media-')
+atexit.register(shutil.rmtree, MEDIA_ROOT, True)